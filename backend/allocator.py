@@ -0,0 +1,132 @@
+"""Free-spot allocator used by the booking endpoint"""
+import threading
+from datetime import datetime, timezone
+from models import db, ParkingLot, ParkingSpot
+
+# How many free spot ids to pull into the pool when it runs dry
+REFILL_BATCH = 200
+
+
+class LocalFreeList:
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def pop(self, lot_id):
+        with self._lock:
+            pool = self._pools.get(lot_id)
+            return pool.pop() if pool else None
+
+    def push(self, lot_id, spot_ids):
+        with self._lock:
+            self._pools.setdefault(lot_id, set()).update(spot_ids)
+
+    def drop(self, lot_id):
+        with self._lock:
+            self._pools.pop(lot_id, None)
+
+
+class RedisFreeList:
+    def __init__(self, client, prefix='parking:free:'):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, lot_id):
+        return f'{self.prefix}{lot_id}'
+
+    def pop(self, lot_id):
+        value = self.client.spop(self._key(lot_id))
+        return int(value) if value is not None else None
+
+    def push(self, lot_id, spot_ids):
+        if spot_ids:
+            self.client.sadd(self._key(lot_id), *spot_ids)
+
+    def drop(self, lot_id):
+        self.client.delete(self._key(lot_id))
+
+
+class SpotAllocator:
+    def __init__(self, free_list=None, max_attempts=10):
+        self.free_list = free_list or LocalFreeList()
+        self.max_attempts = max_attempts
+
+    def claim(self, lot_id):
+        """Claim a free spot in the lot within the current transaction; None if the lot is full"""
+        if db.session.get_bind().dialect.name == 'postgresql':
+            return self._claim_from_table(lot_id)
+
+        for _ in range(self.max_attempts):
+            try:
+                spot_id = self.free_list.pop(lot_id)
+            except Exception as e:
+                print(f"Free list unavailable, claiming from table: {e}")
+                break
+
+            if spot_id is None:
+                if not self._refill(lot_id):
+                    return None
+                continue
+            if self._try_claim(lot_id, spot_id):
+                return db.session.get(ParkingSpot, spot_id, populate_existing=True)
+
+        # The pool kept handing out stale ids (or is unreachable); claim straight from the table
+        return self._claim_from_table(lot_id)
+
+    def release(self, spot):
+        """Return a spot to its lot's pool once the release has been committed"""
+        try:
+            self.free_list.push(spot.lot_id, [spot.id])
+        except Exception as e:
+            print(f"Failed to return spot {spot.id} to free list: {e}")
+
+    def forget(self, lot_id):
+        """Drop the pool of a deleted lot"""
+        try:
+            self.free_list.drop(lot_id)
+        except Exception as e:
+            print(f"Failed to drop free list for lot {lot_id}: {e}")
+
+    def _refill(self, lot_id):
+        spot_ids = [
+            spot_id for (spot_id,) in db.session.query(ParkingSpot.id).filter_by(
+                lot_id=lot_id,
+                status='A'
+            ).order_by(ParkingSpot.id).limit(REFILL_BATCH)
+        ]
+        try:
+            self.free_list.push(lot_id, spot_ids)
+        except Exception as e:
+            print(f"Failed to refill free list for lot {lot_id}: {e}")
+        return bool(spot_ids)
+
+    def _try_claim(self, lot_id, spot_id):
+        """Compare-and-set the spot from available to occupied; False if someone beat us to it"""
+        result = db.session.execute(
+            db.update(ParkingSpot)
+            .where(
+                ParkingSpot.id == spot_id,
+                ParkingSpot.lot_id == lot_id,
+                ParkingSpot.status == 'A'
+            )
+            .values(status='O', updated_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        ParkingLot.shift_spot_counts(lot_id, available=-1, occupied=1)
+        return True
+
+    def _claim_from_table(self, lot_id):
+        for _ in range(self.max_attempts):
+            # Row lock that other claimers skip past (PostgreSQL); SQLite has no row locks and ignores it
+            spot_id = db.session.query(ParkingSpot.id).filter_by(
+                lot_id=lot_id,
+                status='A'
+            ).order_by(ParkingSpot.id).limit(1).with_for_update(skip_locked=True).scalar()
+
+            if spot_id is None:
+                return None
+            if self._try_claim(lot_id, spot_id):
+                return db.session.get(ParkingSpot, spot_id, populate_existing=True)
+        return None
@@ -1,11 +1,61 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db, User
+from passwords import HashingBusy
+from rate_limits import parse_rate
+from tokens import bearer_token
 from functools import wraps
 
 # Create a Blueprint for authentication routes
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+# Login/register attempt counters (set after app initialization)
+rate_limiter = None
+
+def init_rate_limiter(limiter_instance):
+    global rate_limiter
+    rate_limiter = limiter_instance
+
+
+def check_rate_limits(*checks):
+    """
+    Count an attempt against each (config key, bucket) pair, e.g. ('LOGIN_RATE_LIMIT_PER_IP', ip).
+    Returns a 429 response if any limit is exceeded, else None.
+    """
+    if rate_limiter is None:
+        return None
+    retry_after = None
+    for config_key, bucket in checks:
+        limit, window = parse_rate(current_app.config[config_key])
+        wait = rate_limiter.hit(f'{config_key.lower()}:{bucket}', limit, window)
+        if wait is not None:
+            retry_after = max(retry_after or 0, wait)
+    if retry_after is None:
+        return None
+    response = jsonify({
+        'status': 'error',
+        'message': 'Too many attempts. Please try again later.'
+    })
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
+# Bearer token issuing and checks (set after app initialization)
+token_service = None
+
+def init_token_service(service_instance):
+    global token_service
+    token_service = service_instance
+
+
+def hashing_busy_response():
+    response = jsonify({
+        'status': 'error',
+        'message': 'Server is busy. Please try again shortly.'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 
 def admin_required(f):
     @wraps(f)
@@ -20,6 +70,19 @@ def admin_required(f):
     return decorated_function
 
 
+def token_auth_required(f):
+    """404 for the bearer-token endpoints when TOKEN_SECRET_KEY is not configured"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if token_service is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Bearer tokens are not enabled on this server.'
+            }), 404
+        return f(*args, **kwargs)
+    return decorated_function
+
+
 def user_required(f):
     @wraps(f)
     @login_required
@@ -35,6 +98,10 @@ def user_required(f):
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
+    limited = check_rate_limits(('REGISTER_RATE_LIMIT_PER_IP', request.remote_addr))
+    if limited:
+        return limited
+    
     try:
         data = request.get_json()
         
@@ -66,6 +133,9 @@ def register():
         
         db.session.add(new_user)
         db.session.commit()
+        # The admin dashboard counts users (late import: controllers imports this module)
+        from controllers import invalidate_cache
+        invalidate_cache('dashboard')
         
         login_user(new_user)
         
@@ -80,6 +150,9 @@ def register():
             }
         }), 201
         
+    except HashingBusy:
+        db.session.rollback()
+        return hashing_busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -88,39 +161,75 @@ def register():
         }), 500
 
 
+def authenticate(data):
+    """
+    Check login credentials (username or email, and password) under the login rate limits.
+    Returns (user, None) on success or (None, error response).
+    """
+    if not data or not data.get('password'):
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Username/Email and password are required'
+        }), 400)
+    
+    # Count the attempt before any hashing, so throttled guesses cost no CPU
+    limited = check_rate_limits(
+        ('LOGIN_RATE_LIMIT_PER_IP', request.remote_addr),
+        ('LOGIN_RATE_LIMIT_PER_USERNAME', (data.get('username') or data.get('email') or '').lower())
+    )
+    if limited:
+        return None, limited
+    
+    user = None
+    if data.get('username'):
+        user = User.query.filter_by(username=data['username']).first()
+    elif data.get('email'):
+        user = User.query.filter_by(email=data['email']).first()
+    else:
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Please provide username or email'
+        }), 400)
+    
+    if not user or not user.check_password(data['password']):
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Invalid credentials'
+        }), 401)
+    
+    if not user.is_active:
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Account is deactivated. Please contact admin.'
+        }), 403)
+    
+    # Upgrade hashes made with older parameters while we have the plaintext
+    if user.password_needs_rehash():
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except HashingBusy:
+            db.session.rollback()
+    
+    return user, None
+
+
+def user_summary(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.get_role(),
+        'is_admin': user.is_admin
+    }
+
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     try:
-        data = request.get_json()
-        
-        if not data or not data.get('password'):
-            return jsonify({
-                'status': 'error',
-                'message': 'Username/Email and password are required'
-            }), 400
-        
-        user = None
-        if data.get('username'):
-            user = User.query.filter_by(username=data['username']).first()
-        elif data.get('email'):
-            user = User.query.filter_by(email=data['email']).first()
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Please provide username or email'
-            }), 400
-        
-        if not user or not user.check_password(data['password']):
-            return jsonify({
-                'status': 'error',
-                'message': 'Invalid credentials'
-            }), 401
-        
-        if not user.is_active:
-            return jsonify({
-                'status': 'error',
-                'message': 'Account is deactivated. Please contact admin.'
-            }), 403
+        user, error = authenticate(request.get_json())
+        if error:
+            return error
         
         login_user(user, remember=True)
         session.permanent = True
@@ -128,15 +237,11 @@ def login():
         return jsonify({
             'status': 'success',
             'message': 'Login successful',
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.get_role(),
-                'is_admin': user.is_admin
-            }
+            'user': user_summary(user)
         }), 200
         
+    except HashingBusy:
+        return hashing_busy_response()
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -144,6 +249,85 @@ def login():
         }), 500
 
 
+@auth_bp.route('/token', methods=['POST'])
+@token_auth_required
+def issue_token():
+    """Bearer-token login: same credentials as /login, but no session cookie"""
+    try:
+        user, error = authenticate(request.get_json())
+        if error:
+            return error
+        
+        return jsonify({
+            'status': 'success',
+            'user': user_summary(user),
+            **token_service.issue(user)
+        }), 200
+        
+    except HashingBusy:
+        return hashing_busy_response()
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Token request failed: {str(e)}'
+        }), 500
+
+
+@auth_bp.route('/token/refresh', methods=['POST'])
+@token_auth_required
+def refresh_token():
+    """New token pair for a valid refresh token; the refresh token used is revoked"""
+    data = request.get_json(silent=True) or {}
+    payload = token_service.verify(data.get('refresh_token', ''), 'refresh')
+    if payload is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid or expired refresh token'
+        }), 401
+    
+    # The one DB read of token mode: deactivated users stop getting access tokens here
+    user = db.session.get(User, payload['sub'])
+    if not user or not user.is_active:
+        return jsonify({
+            'status': 'error',
+            'message': 'Account is not active'
+        }), 401
+    
+    if not token_service.revoke(payload, 'refresh'):
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid or expired refresh token'
+        }), 401
+    
+    return jsonify({
+        'status': 'success',
+        **token_service.issue(user)
+    }), 200
+
+
+@auth_bp.route('/token/revoke', methods=['POST'])
+@token_auth_required
+def revoke_token():
+    """Bearer-token logout: revokes the access token sent and the refresh token in the body"""
+    access_payload = token_service.verify(bearer_token(request) or '', 'access')
+    data = request.get_json(silent=True) or {}
+    refresh_payload = token_service.verify(data.get('refresh_token', ''), 'refresh')
+    if access_payload is None and refresh_payload is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'No valid token to revoke'
+        }), 401
+    
+    if access_payload:
+        token_service.revoke(access_payload, 'access')
+    if refresh_payload:
+        token_service.revoke(refresh_payload, 'refresh')
+    return jsonify({
+        'status': 'success',
+        'message': 'Token revoked'
+    }), 200
+
+
 @auth_bp.route('/logout', methods=['POST'])
 @login_required
 def logout():
@@ -158,16 +342,18 @@ def logout():
 @auth_bp.route('/me', methods=['GET'])
 @login_required
 def get_current_user():
+    # current_user is a cached snapshot; the profile needs the full row
+    user = db.session.get(User, current_user.id)
     return jsonify({
         'status': 'success',
         'user': {
-            'id': current_user.id,
-            'username': current_user.username,
-            'email': current_user.email,
-            'phone_number': current_user.phone_number,
-            'role': current_user.get_role(),
-            'is_admin': current_user.is_admin,
-            'created_at': current_user.created_at.isoformat()
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'phone_number': user.phone_number,
+            'role': user.get_role(),
+            'is_admin': user.is_admin,
+            'created_at': user.created_at.isoformat()
         }
     }), 200
 
@@ -184,20 +370,28 @@ def change_password():
                 'message': 'Current password and new password are required'
             }), 400
         
-        if not current_user.check_password(data['current_password']):
+        user = db.session.get(User, current_user.id)
+        if not user.check_password(data['current_password']):
             return jsonify({
                 'status': 'error',
                 'message': 'Current password is incorrect'
             }), 401
         
-        current_user.set_password(data['new_password'])
+        # Committing the new hash evicts the cached session user (see principals.py)
+        user.set_password(data['new_password'])
         db.session.commit()
+        # Bearer tokens issued before the change stop working
+        if token_service is not None:
+            token_service.revoke_user(user.id)
         
         return jsonify({
             'status': 'success',
             'message': 'Password changed successfully'
         }), 200
         
+    except HashingBusy:
+        db.session.rollback()
+        return hashing_busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -0,0 +1,117 @@
+"""Live lot availability push (Server-Sent Events)"""
+import json
+import queue
+import threading
+import time
+
+# Events buffered per client before it is considered too slow and dropped
+CLIENT_QUEUE_SIZE = 100
+
+
+class LocalAvailabilityBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """A queue that receives every event published from now on"""
+        subscriber = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        with self._lock:
+            return subscriber in self._subscribers
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _fan_out(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client: drop it; its stream ends and the client reconnects and reloads
+                self.unsubscribe(subscriber)
+
+    def publish(self, event):
+        self._fan_out(event)
+
+
+class RedisAvailabilityBroker(LocalAvailabilityBroker):
+    """Fans out events published by any process through one Redis channel"""
+
+    def __init__(self, client, channel='parking:availability'):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+        self._listener = None
+
+    def subscribe(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+        return super().subscribe()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self._fan_out(json.loads(message['data']))
+            except Exception as e:
+                print(f"Availability subscription lost, reconnecting: {e}")
+                time.sleep(1)
+
+    def publish(self, event):
+        try:
+            self.client.publish(self.channel, json.dumps(event))
+        except Exception as e:
+            # Redis is down: at least reach the clients of this process
+            print(f"Failed to publish availability event: {e}")
+            self._fan_out(event)
+
+
+def lot_availability_event(lot, change):
+    """
+    Event for one booking ('booked') or release ('released') in a lot, or an admin change to the
+    lot itself ('created', 'updated'), with its new counts
+    """
+    return {
+        'lot_id': lot.id,
+        'change': change,
+        'available_spots': lot.available_count,
+        'occupied_spots': lot.occupied_count,
+        'total_spots': lot.number_of_spots
+    }
+
+
+def lot_deleted_event(lot_id):
+    return {'lot_id': lot_id, 'change': 'deleted'}
+
+
+def sse_stream(broker, subscriber, keepalive=15):
+    """SSE frames for a subscriber queue, with comment keepalives so proxies keep the connection"""
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                event = subscriber.get(timeout=keepalive)
+            except queue.Empty:
+                if not broker.is_subscribed(subscriber):
+                    return
+                yield ': keepalive\n\n'
+                continue
+            yield f'event: availability\ndata: {json.dumps(event)}\n\n'
+    finally:
+        broker.unsubscribe(subscriber)
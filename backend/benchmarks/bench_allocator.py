@@ -0,0 +1,180 @@
+"""
+Contention benchmark for the booking spot allocator
+
+Fires N concurrent booking attempts at a single lot (fewer spots than requests)
+and reports double-bookings, counter drift and latency percentiles. Runs against
+a throwaway SQLite file so it never touches instance/parking_app.db.
+
+The 'redis' mode books from --processes worker processes sharing one Redis free
+list, as gunicorn workers do; it is skipped when Redis is unreachable.
+
+    python benchmarks/bench_allocator.py --requests 1000 --spots 500 --workers 64 --processes 8
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from common import make_app, remove_db, temp_db_path
+import redis
+from models import db, ParkingLot, ParkingSpot, bulk_create_spots
+from allocator import SpotAllocator, RedisFreeList
+
+
+# Concurrent writers queue on SQLite's lock instead of failing after the default 5s
+ENGINE_OPTIONS = {'connect_args': {'timeout': 60}}
+
+
+def seed_lot(app, spots):
+    with app.app_context():
+        db.create_all()
+        lot = ParkingLot(
+            prime_location_name='Bench Lot', price=10.0, address='-', pin_code='000000',
+            number_of_spots=spots, available_count=spots, occupied_count=0
+        )
+        db.session.add(lot)
+        db.session.flush()
+        bulk_create_spots(lot.id, spots)
+        db.session.commit()
+        return lot.id
+
+
+def book_naive(lot_id):
+    """The original book_parking_spot path: read the first free spot, then mark it"""
+    spot = ParkingSpot.query.filter_by(lot_id=lot_id, status='A').first()
+    if not spot:
+        return None
+    spot.mark_occupied()
+    return spot.id
+
+
+def attempt(mode, allocator, lot_id):
+    """One booking attempt in its own transaction; returns (spot id or None if full or 'error', latency)"""
+    started = time.perf_counter()
+    try:
+        if mode == 'naive':
+            spot_id = book_naive(lot_id)
+        else:
+            spot = allocator.claim(lot_id)
+            spot_id = spot.id if spot else None
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        spot_id = 'error'
+    return spot_id, time.perf_counter() - started
+
+
+def run(mode, requests, spots, workers):
+    db_path = temp_db_path()
+    app = make_app(db_path, ENGINE_OPTIONS)
+    lot_id = seed_lot(app, spots)
+    allocator = SpotAllocator()
+    start_gate = threading.Barrier(min(workers, requests))
+
+    def attempt_in_thread(i):
+        if i < workers:
+            start_gate.wait()
+        with app.app_context():
+            return attempt(mode, allocator, lot_id)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        wall_start = time.perf_counter()
+        results = list(pool.map(attempt_in_thread, range(requests)))
+        wall = time.perf_counter() - wall_start
+
+    title = f"[{mode}] {requests} requests, {spots} spots, {workers} workers"
+    report(title, app, db_path, lot_id, spots, results, wall)
+
+
+def redis_worker(db_path, redis_url, prefix, lot_id, requests):
+    """One process booking through the shared Redis free list; returns its attempts"""
+    app = make_app(db_path, ENGINE_OPTIONS)
+    allocator = SpotAllocator(RedisFreeList(redis.Redis.from_url(redis_url), prefix=prefix))
+    with app.app_context():
+        results = []
+        for _ in range(requests):
+            results.append(attempt('redis', allocator, lot_id))
+            db.session.remove()
+        return results
+
+
+def run_redis(requests, spots, processes, redis_url):
+    client = redis.Redis.from_url(redis_url, socket_connect_timeout=1)
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        print(f"[redis] skipped: Redis unavailable at {redis_url} ({e})")
+        return
+
+    db_path = temp_db_path()
+    app = make_app(db_path, ENGINE_OPTIONS)
+    lot_id = seed_lot(app, spots)
+    with app.app_context():
+        db.engine.dispose()
+    # A key prefix of its own, so the run never touches the app's free lists
+    prefix = f'bench:free:{uuid.uuid4().hex}:'
+
+    shares = [requests // processes + (1 if i < requests % processes else 0) for i in range(processes)]
+    try:
+        with multiprocessing.Pool(processes) as pool:
+            wall_start = time.perf_counter()
+            per_process = pool.starmap(
+                redis_worker, [(db_path, redis_url, prefix, lot_id, share) for share in shares if share]
+            )
+            wall = time.perf_counter() - wall_start
+    finally:
+        client.delete(f'{prefix}{lot_id}')
+
+    results = [result for attempts in per_process for result in attempts]
+    title = f"[redis] {requests} requests, {spots} spots, {processes} processes"
+    report(title, app, db_path, lot_id, spots, results, wall)
+
+
+def report(title, app, db_path, lot_id, spots, results, wall):
+    requests = len(results)
+    claimed = [spot_id for spot_id, _ in results if spot_id not in (None, 'error')]
+    errors = sum(1 for spot_id, _ in results if spot_id == 'error')
+    double_booked = sum(count - 1 for count in Counter(claimed).values() if count > 1)
+    latencies = sorted(elapsed for _, elapsed in results)
+
+    with app.app_context():
+        lot = db.session.get(ParkingLot, lot_id)
+        occupied_rows = ParkingSpot.query.filter_by(lot_id=lot_id, status='O').count()
+        counters = (lot.available_count, lot.occupied_count)
+        db.engine.dispose()
+
+    remove_db(db_path)
+    # How far the lot's counters are from the spot rows they summarize
+    drift = (counters[0] - (spots - occupied_rows), counters[1] - occupied_rows)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(title)
+    print(f"  successful bookings : {len(claimed)} (occupied rows {occupied_rows}, counters {counters})")
+    print(f"  double bookings     : {double_booked}")
+    print(f"  counter drift       : available {drift[0]:+d}, occupied {drift[1]:+d}")
+    print(f"  errors              : {errors}")
+    print(f"  throughput          : {requests / wall:.0f} req/s")
+    print(f"  latency p50/p99     : {pct(0.50):.1f} ms / {pct(0.99):.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--spots', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--redis-url', default='redis://localhost:6379/0')
+    parser.add_argument('--mode', choices=['allocator', 'naive', 'redis', 'all'], default='all')
+    args = parser.parse_args()
+
+    modes = ['naive', 'allocator', 'redis'] if args.mode == 'all' else [args.mode]
+    for mode in modes:
+        if mode == 'redis':
+            run_redis(args.requests, args.spots, args.processes, args.redis_url)
+        else:
+            run(mode, args.requests, args.spots, args.workers)
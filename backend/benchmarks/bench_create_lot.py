@@ -0,0 +1,67 @@
+"""
+Lot creation benchmark: per-object ORM inserts vs bulk_create_spots
+
+Reports wall time and peak traced Python memory for each lot size. Runs
+against a throwaway SQLite file so it never touches instance/parking_app.db.
+
+    python benchmarks/bench_create_lot.py --sizes 1000 10000 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+from common import make_app, remove_db, temp_db_path
+from models import db, ParkingLot, ParkingSpot, bulk_create_spots, generate_spot_numbers
+
+
+def create_lot_orm(lot_id, num_spots):
+    """The original create_parking_lot loop: one ORM object per spot held until commit"""
+    for spot_number in generate_spot_numbers(num_spots):
+        db.session.add(ParkingSpot(
+            lot_id=lot_id,
+            spot_number=spot_number,
+            status='A',
+            vehicle_type='4-wheeler'
+        ))
+
+
+def measure(app, create_spots, num_spots):
+    with app.app_context():
+        lot = ParkingLot(
+            prime_location_name='Bench Lot', price=10.0, address='-', pin_code='000000',
+            number_of_spots=num_spots, available_count=num_spots, occupied_count=0
+        )
+        db.session.add(lot)
+        db.session.flush()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        create_spots(lot.id, num_spots)
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        created = ParkingSpot.query.filter_by(lot_id=lot.id).count()
+        assert created == num_spots, f'expected {num_spots} spots, found {created}'
+        return elapsed, peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    with app.app_context():
+        db.create_all()
+
+    print(f"{'spots':>8} | {'orm time':>9} | {'orm peak':>9} | {'bulk time':>9} | {'bulk peak':>9}")
+    for size in args.sizes:
+        orm_time, orm_peak = measure(app, create_lot_orm, size)
+        bulk_time, bulk_peak = measure(app, bulk_create_spots, size)
+        print(f"{size:>8} | {orm_time:>8.2f}s | {orm_peak / 2**20:>7.1f}MB | "
+              f"{bulk_time:>8.2f}s | {bulk_peak / 2**20:>7.1f}MB")
+
+    remove_db(db_path)
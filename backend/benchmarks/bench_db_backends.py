@@ -0,0 +1,120 @@
+"""
+Booking throughput benchmark: SQLite (WAL) vs PostgreSQL
+
+Each worker thread loops book -> release through the spot allocator and the
+same model methods the API uses, committing after every step. Reports
+book+release cycles per second and failed transactions for each database.
+
+    python benchmarks/bench_db_backends.py --workers 16 --seconds 20 \\
+        --database sqlite-wal --database postgresql://postgres@localhost/parking_bench
+
+A throwaway PostgreSQL instance is enough, e.g.
+    docker run --rm -e POSTGRES_HOST_AUTH_METHOD=trust -e POSTGRES_DB=parking_bench -p 5432:5432 postgres:16
+The PostgreSQL database is dropped and recreated by the benchmark, so never point it at real data.
+"""
+import argparse
+import threading
+import time
+
+from common import make_app, remove_db, temp_db_path
+from sqlalchemy import event
+from models import db, User, ParkingLot, Reservation, bulk_create_spots
+from allocator import SpotAllocator
+
+
+def make_backend_app(database):
+    if database == 'sqlite-wal':
+        path = temp_db_path()
+        app = make_app(path, {'connect_args': {'timeout': 60}})
+    else:
+        path = None
+        app = make_app(database, {'pool_size': 32, 'max_overflow': 32, 'pool_pre_ping': True})
+
+    if database == 'sqlite-wal':
+        with app.app_context():
+            @event.listens_for(db.engine, 'connect')
+            def set_wal(dbapi_connection, _):
+                cursor = dbapi_connection.cursor()
+                cursor.execute('PRAGMA journal_mode=WAL')
+                cursor.execute('PRAGMA synchronous=NORMAL')
+                cursor.close()
+    return app, path
+
+
+def seed(app, workers, spots):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        lot = ParkingLot(
+            prime_location_name='Bench Lot', price=10.0, address='-', pin_code='000000',
+            number_of_spots=spots, available_count=spots, occupied_count=0
+        )
+        db.session.add(lot)
+        users = [User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='-') for i in range(workers)]
+        db.session.add_all(users)
+        db.session.flush()
+        bulk_create_spots(lot.id, spots)
+        db.session.commit()
+        return lot.id, [user.id for user in users]
+
+
+def run(database, workers, seconds, spots):
+    app, path = make_backend_app(database)
+    lot_id, user_ids = seed(app, workers, spots)
+    allocator = SpotAllocator()
+    deadline = time.perf_counter() + seconds
+    cycles = [0] * workers
+    failures = [0] * workers
+
+    def loop(index):
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                try:
+                    spot = allocator.claim(lot_id)
+                    reservation = Reservation(spot_id=spot.id, user_id=user_ids[index], status='active')
+                    db.session.add(reservation)
+                    db.session.commit()
+
+                    reservation = Reservation.query.filter_by(id=reservation.id).with_for_update().first()
+                    reservation.complete_reservation()
+                    db.session.commit()
+                    allocator.release(reservation.parking_spot)
+                    cycles[index] += 1
+                except Exception:
+                    db.session.rollback()
+                    failures[index] += 1
+                finally:
+                    db.session.remove()
+
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        lot = db.session.get(ParkingLot, lot_id)
+        consistent = lot.available_count == spots and lot.occupied_count == 0
+        db.engine.dispose()
+    if path:
+        remove_db(path)
+
+    label = database if database == 'sqlite-wal' else database.split('://')[0]
+    print(f"[{label}] {workers} workers, {elapsed:.1f}s")
+    print(f"  book+release cycles : {sum(cycles)} ({sum(cycles) / elapsed:.0f}/s)")
+    print(f"  failed transactions : {sum(failures)}")
+    print(f"  lot counters intact : {consistent}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', action='append', help="'sqlite-wal' or a SQLAlchemy URL (repeatable)")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--spots', type=int, default=1000)
+    args = parser.parse_args()
+
+    for database in args.database or ['sqlite-wal']:
+        run(database, args.workers, args.seconds, args.spots)
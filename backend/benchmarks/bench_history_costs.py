@@ -0,0 +1,160 @@
+"""
+History, charts and dashboard for a heavy user: per-object costing vs SQL-computed durations
+
+Seeds a throwaway SQLite database with one user holding N reservations (one
+still active) across a few lots, then times each endpoint through the real app:
+- legacy: condensed copies of the old code paths, which load Reservation
+  objects, lazy-load spot and lot per row and call get_duration_hours() (a fresh
+  clock reading each time)
+- current: the endpoints as they are now, fetching plain rows with durations
+  computed (and, for charts, grouped per lot) by the database
+
+    python benchmarks/bench_history_costs.py --reservations 50000
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import temp_app_module
+
+LOTS = 10
+SPOTS_PER_LOT = 100
+
+
+def seed(app_module, reservations):
+    from models import db, User, ParkingLot, ParkingSpot, Reservation, bulk_create_spots, backfill_rollups
+
+    with app_module.app.app_context():
+        user = User(username='heavy', email='heavy@example.com', is_admin=False)
+        user.set_password('bench-password')
+        db.session.add(user)
+        for i in range(LOTS):
+            lot = ParkingLot(
+                prime_location_name=f'Lot {i}', price=10.0 + i, address='-', pin_code='000000',
+                number_of_spots=SPOTS_PER_LOT, available_count=SPOTS_PER_LOT, occupied_count=0
+            )
+            db.session.add(lot)
+            db.session.flush()
+            bulk_create_spots(lot.id, SPOTS_PER_LOT)
+        db.session.commit()
+
+        spot_ids = [spot_id for (spot_id,) in db.session.query(ParkingSpot.id)]
+        rng = random.Random(42)
+        start = datetime.utcnow() - timedelta(days=3 * 365)
+        rows = []
+        for i in range(reservations):
+            parked = start + timedelta(minutes=30 * i)
+            hours = rng.randint(1, 8)
+            active = i == reservations - 1
+            rows.append(dict(
+                spot_id=rng.choice(spot_ids), user_id=user.id, status='active' if active else 'completed',
+                parking_timestamp=parked, leaving_timestamp=None if active else parked + timedelta(hours=hours),
+                parking_cost=None if active else 10.0 * hours, created_at=parked
+            ))
+        db.session.execute(Reservation.__table__.insert(), rows)
+        db.session.commit()
+        backfill_rollups()
+        return user.id
+
+
+def legacy_charts(user_id):
+    """Condensed copy of the old get_user_charts lot grouping"""
+    from models import Reservation
+    lot_usage = {}
+    for res in Reservation.query.filter_by(user_id=user_id, status='completed').all():
+        lot_name = res.parking_spot.parking_lot.prime_location_name
+        stats = lot_usage.setdefault(lot_name, {'visits': 0, 'total_hours': 0, 'total_cost': 0})
+        stats['visits'] += 1
+        stats['total_hours'] += res.get_duration_hours()
+        stats['total_cost'] += res.parking_cost or 0
+    return lot_usage
+
+
+def legacy_export(user_id):
+    """Condensed copy of the old CSV export: one Reservation object and get_duration_hours() per row"""
+    from models import Reservation
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for res in Reservation.query.filter_by(user_id=user_id).order_by(Reservation.created_at.desc()).all():
+        writer.writerow([
+            res.id, res.parking_spot.parking_lot.prime_location_name, res.parking_spot.spot_number,
+            res.vehicle_number, res.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            res.leaving_timestamp.strftime('%Y-%m-%d %H:%M:%S') if res.leaving_timestamp else 'Active',
+            f"{res.get_duration_hours():.2f}", f"{res.parking_cost or 0:.2f}", res.status
+        ])
+    return buffer.getvalue()
+
+
+def legacy_dashboard(user_id):
+    """Condensed copy of the old user_dashboard queries"""
+    from sqlalchemy import func
+    from models import db, Reservation
+    active = Reservation.query.filter_by(user_id=user_id, status='active').all()
+    history = Reservation.query.filter_by(user_id=user_id, status='completed').order_by(
+        Reservation.leaving_timestamp.desc()
+    ).limit(10).all()
+    db.session.query(func.sum(Reservation.parking_cost)).filter(
+        Reservation.user_id == user_id, Reservation.status == 'completed'
+    ).scalar()
+    Reservation.query.filter_by(user_id=user_id).count()
+    return [
+        (res.parking_spot.parking_lot.prime_location_name, res.get_duration_hours(),
+         round(res.get_duration_hours() * res.parking_spot.parking_lot.price, 2))
+        for res in active
+    ] + [(res.parking_spot.parking_lot.prime_location_name, res.get_duration_hours()) for res in history]
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reservations', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with temp_app_module(EXPORT_SYNC_MAX_ROWS=str(args.reservations + 1)) as app_module:
+        started = time.perf_counter()
+        user_id = seed(app_module, args.reservations)
+        print(f"Seeded {args.reservations} reservations for one user in {time.perf_counter() - started:.1f}s\n")
+
+        client = app_module.app.test_client()
+        client.post('/api/auth/login', json={'username': 'heavy', 'password': 'bench-password'})
+
+        def endpoint(path):
+            def call():
+                response = client.get(path)
+                response.get_data()
+                assert response.status_code == 200, response.status_code
+            return call
+
+        def in_context(fn):
+            def call():
+                with app_module.app.app_context():
+                    fn(user_id)
+            return call
+
+        cases = [
+            ('charts (by lot)', in_context(legacy_charts), endpoint('/api/user/charts/my-usage')),
+            ('history CSV', in_context(legacy_export), endpoint('/api/user/export-history.csv')),
+            ('dashboard', in_context(legacy_dashboard), endpoint('/api/user/dashboard')),
+        ]
+        print(f"{'':18} {'legacy':>10} {'current':>10} {'speedup':>8}")
+        for name, legacy, current in cases:
+            legacy_time = timed(legacy, args.repeat)
+            current_time = timed(current, args.repeat)
+            print(f"{name:18} {legacy_time * 1000:8.0f}ms {current_time * 1000:8.0f}ms {legacy_time / current_time:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Login throughput benchmark
+
+1. Cost of one hash for each --methods entry.
+2. A login burst: --clients threads log in back to back for --seconds while
+   --readers threads hit a light endpoint. 'inline' gives every request its own
+   hashing thread (as hashing inside the request did); 'pool' uses the bounded
+   PasswordHasher pool (--pool-workers). Reports logins/s, 503s, and reader p50/p99.
+3. Credential stuffing: --stuffing wrong-password attempts from one IP, with and
+   without the login rate limits; reports time spent and requests turned away.
+
+Runs against a throwaway SQLite file.
+
+    python benchmarks/bench_login.py --clients 16 --readers 4 --seconds 10
+"""
+import argparse
+import threading
+import time
+
+from common import make_app, remove_db, temp_db_path
+from flask import jsonify
+from flask_login import LoginManager
+from models import db, User
+from passwords import PasswordHasher, init_password_hasher
+from rate_limits import LocalRateLimiter
+import auth
+
+
+def make_auth_app(db_path):
+    app = make_app(db_path, config={
+        'SECRET_KEY': 'bench',
+        'LOGIN_RATE_LIMIT_PER_IP': '30/60',
+        'LOGIN_RATE_LIMIT_PER_USERNAME': '10/60',
+        'REGISTER_RATE_LIMIT_PER_IP': '10/600'
+    })
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(auth.auth_bp)
+
+    @app.route('/ping')
+    def ping():
+        return jsonify({'users': User.query.count()})
+
+    return app
+
+
+def seed(app, users, method):
+    init_password_hasher(PasswordHasher(method))
+    with app.app_context():
+        db.create_all()
+        password_hash = PasswordHasher(method).hash('bench-password')
+        db.session.add_all([
+            User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash=password_hash)
+            for i in range(users)
+        ])
+        db.session.commit()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def hash_costs(methods):
+    for method in methods:
+        hasher = PasswordHasher(method, workers=1)
+        hasher.hash('warm-up')
+        started = time.perf_counter()
+        for _ in range(5):
+            hasher.hash('bench-password')
+        print(f"{hasher.method:28} {(time.perf_counter() - started) / 5 * 1000:8.1f} ms per hash")
+
+
+def login_burst(app, mode, clients, readers, seconds, pool_workers, method):
+    workers = clients if mode == 'inline' else pool_workers
+    init_password_hasher(PasswordHasher(method, workers=workers, max_pending=clients * 4))
+    auth.init_rate_limiter(None)
+
+    logins, busy, read_latencies = [0], [0], []
+    count_lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def log_in(index):
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            status = client.post('/api/auth/login', json={
+                'username': f'bench{index}', 'password': 'bench-password'
+            }).status_code
+            with count_lock:
+                if status == 200:
+                    logins[0] += 1
+                elif status == 503:
+                    busy[0] += 1
+
+    def read():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            client.get('/ping')
+            elapsed = time.perf_counter() - started
+            with count_lock:
+                read_latencies.append(elapsed)
+
+    threads = [threading.Thread(target=log_in, args=(i,)) for i in range(clients)]
+    threads += [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"{mode:7} hash threads={workers:3}  {logins[0] / seconds:7.1f} logins/s  {busy[0]:5} busy (503)  "
+          f"reader p50 {percentile(read_latencies, 0.5) * 1000:7.1f} ms  "
+          f"p99 {percentile(read_latencies, 0.99) * 1000:7.1f} ms  ({len(read_latencies)} reads)")
+
+
+def stuffing(app, attempts, limited, method):
+    init_password_hasher(PasswordHasher(method))
+    auth.init_rate_limiter(LocalRateLimiter() if limited else None)
+    client = app.test_client()
+    statuses = {}
+    started = time.perf_counter()
+    for i in range(attempts):
+        status = client.post('/api/auth/login', json={
+            'username': f'bench{i % 50}', 'password': f'guess-{i}'
+        }).status_code
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+    print(f"{'limited' if limited else 'open':7} {attempts} attempts in {elapsed:6.2f}s  "
+          f"{statuses.get(401, 0):5} checked  {statuses.get(429, 0):5} throttled (429)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--pool-workers', type=int, default=2)
+    parser.add_argument('--stuffing', type=int, default=500)
+    parser.add_argument('--method', default='scrypt:32768:8:1')
+    parser.add_argument('--methods', default='scrypt:16384:8:1,scrypt:32768:8:1,pbkdf2:sha256:600000')
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        app = make_auth_app(db_path)
+        seed(app, max(args.clients, 50), args.method)
+
+        print('Hash cost')
+        hash_costs(args.methods.split(','))
+        print(f"\nLogin burst ({args.clients} clients, {args.readers} readers, {args.seconds:.0f}s, {args.method})")
+        for mode in ('inline', 'pool'):
+            login_burst(app, mode, args.clients, args.readers, args.seconds, args.pool_workers, args.method)
+        print("\nCredential stuffing from one IP")
+        for limited in (False, True):
+            stuffing(app, args.stuffing, limited, args.method)
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Monthly report generation benchmark: per-user queries vs the sharded pipeline
+
+Seeds a throwaway SQLite database with N users and M completed reservations in
+the previous month, then renders every user's report twice (no mail is sent):
+- legacy: one reservation query per user, lot/spot lazy-loaded per row and the
+  HTML built by string concatenation (the old generate_monthly_report path)
+- pipeline: reports.iter_monthly_reports() over REPORT_SHARD_SIZE user shards,
+  run one after another here; Celery spreads the same shards across workers
+
+    python benchmarks/bench_monthly_report.py --users 10000 --reservations 1000000
+
+The legacy path takes minutes per thousand users at this size; --skip-legacy
+times the pipeline alone.
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from common import make_app, remove_db, temp_db_path
+from models import db, User, ParkingLot, ParkingSpot, Reservation, UserMonthlyStat, bulk_create_spots
+from reports import previous_month, report_user_shards, iter_monthly_reports
+
+LOTS = 20
+SPOTS_PER_LOT = 200
+
+
+def seed(users, reservations, month, month_end):
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        dict(username=f'user{i}', email=f'user{i}@example.com', password_hash='-', is_admin=False, is_active=True)
+        for i in range(users)
+    ])
+    for i in range(LOTS):
+        lot = ParkingLot(
+            prime_location_name=f'Lot {i}', price=10.0, address='-', pin_code='000000',
+            number_of_spots=SPOTS_PER_LOT, available_count=SPOTS_PER_LOT, occupied_count=0
+        )
+        db.session.add(lot)
+        db.session.flush()
+        bulk_create_spots(lot.id, SPOTS_PER_LOT)
+    db.session.commit()
+
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+    spot_ids = [spot_id for (spot_id,) in db.session.query(ParkingSpot.id)]
+    seconds = int((month_end - month).total_seconds()) - 86400
+    rng = random.Random(42)
+    for start in range(0, reservations, 50000):
+        rows = []
+        for _ in range(min(50000, reservations - start)):
+            parked = month + timedelta(seconds=rng.randrange(seconds))
+            hours = rng.randint(1, 8)
+            rows.append(dict(
+                spot_id=rng.choice(spot_ids), user_id=rng.choice(user_ids), status='completed',
+                parking_timestamp=parked, leaving_timestamp=parked + timedelta(hours=hours),
+                parking_cost=10.0 * hours, created_at=parked
+            ))
+        db.session.execute(Reservation.__table__.insert(), rows)
+    db.session.commit()
+
+    # Monthly rollup straight from SQL (the app maintains it on every release)
+    db.session.execute(db.text("""
+        INSERT INTO user_monthly_stats (user_id, month, reservations, hours, revenue)
+        SELECT user_id, :month, COUNT(*),
+               SUM((julianday(leaving_timestamp) - julianday(parking_timestamp)) * 24), SUM(parking_cost)
+        FROM reservations GROUP BY user_id
+    """), {'month': month})
+    db.session.commit()
+
+
+def legacy_report_html(user, reservations, month, stats):
+    """Condensed copy of the old generate_report_html: lazy loads per row, += concatenation"""
+    lot_usage = {}
+    for res in reservations:
+        lot_name = res.parking_spot.parking_lot.prime_location_name
+        lot_usage[lot_name] = lot_usage.get(lot_name, 0) + 1
+    most_used_lot = max(lot_usage.items(), key=lambda x: x[1])[0] if lot_usage else "N/A"
+
+    html = f"""<html><body><h1>Monthly Parking Activity Report</h1><p>{month.strftime('%B %Y')}</p>
+        <h2>Hello {user.username},</h2><div>{stats.reservations}</div><div>{stats.hours:.1f}</div>
+        <div>₹{stats.revenue:.2f}</div><div>{most_used_lot}</div><table><tbody>"""
+    for res in reservations[:10]:
+        html += f"""<tr><td>{res.parking_timestamp.strftime('%d %b %Y')}</td>
+            <td>{res.parking_spot.parking_lot.prime_location_name}</td><td>{res.parking_spot.spot_number}</td>
+            <td>{res.get_duration_hours():.1f}</td><td>₹{res.parking_cost or 0:.2f}</td></tr>"""
+    html += "</tbody></table></body></html>"
+    return html
+
+
+def run_legacy(month, month_end):
+    count = 0
+    recipients = db.session.query(User, UserMonthlyStat).join(
+        UserMonthlyStat, UserMonthlyStat.user_id == User.id
+    ).filter(UserMonthlyStat.month == month, UserMonthlyStat.reservations > 0).all()
+    for user, stats in recipients:
+        reservations = Reservation.query.filter(
+            Reservation.user_id == user.id,
+            Reservation.status == 'completed',
+            Reservation.parking_timestamp >= month,
+            Reservation.parking_timestamp < month_end
+        ).order_by(Reservation.parking_timestamp).all()
+        legacy_report_html(user, reservations, month, stats)
+        count += 1
+    return count
+
+
+def run_pipeline(month):
+    count = 0
+    shard_times = []
+    for first_user_id, last_user_id in report_user_shards(month):
+        started = time.perf_counter()
+        for _ in iter_monthly_reports(month, first_user_id, last_user_id):
+            count += 1
+        shard_times.append(time.perf_counter() - started)
+        db.session.expunge_all()
+    return count, shard_times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--reservations', type=int, default=1000000)
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    month, month_end = previous_month()
+
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.users, args.reservations, month, month_end)
+        print(f"Seeded {args.users} users and {args.reservations} reservations in {time.perf_counter() - started:.1f}s")
+
+        if not args.skip_legacy:
+            started = time.perf_counter()
+            reports = run_legacy(month, month_end)
+            print(f"[legacy]   {reports} reports in {time.perf_counter() - started:.1f}s")
+            db.session.expunge_all()
+
+        started = time.perf_counter()
+        reports, shard_times = run_pipeline(month)
+        elapsed = time.perf_counter() - started
+        print(f"[pipeline] {reports} reports in {elapsed:.1f}s "
+              f"({len(shard_times)} shards, slowest {max(shard_times):.2f}s)")
+
+    remove_db(db_path)
@@ -0,0 +1,153 @@
+"""
+Tiered pricing: per-quote rule evaluation vs compiled rate tables
+
+1. Quotes: prices --quotes random stays (up to --max-hours long) under a lot's
+   peak/off-peak/weekend rules with a daily cap, first by walking the stay
+   minute by minute and checking every rule (the straightforward way to apply
+   time-of-day pricing), then with the lot's compiled RateTable. Checks both
+   agree to the cent.
+2. Bulk repricing: seeds --reservations completed reservations across a few
+   lots in a throwaway SQLite database and times reprice_reservations() over
+   all of them.
+
+    python benchmarks/bench_pricing.py --quotes 2000 --reservations 100000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import temp_app_module
+from pricing import DAY_NAMES, compile_rules, rate_table
+
+PRICE = 20.0
+RULES = {
+    'utc_offset_minutes': 330,
+    'weekend_price': 30.0,
+    'windows': [
+        {'days': ['mon', 'tue', 'wed', 'thu', 'fri'], 'start': '08:00', 'end': '11:00', 'price': 60.0},
+        {'days': ['mon', 'tue', 'wed', 'thu', 'fri'], 'start': '17:00', 'end': '20:00', 'price': 50.0},
+        {'start': '22:00', 'end': '06:00', 'price': 10.0}
+    ],
+    'daily_cap': 400.0
+}
+
+
+def naive_cost(price, rules, start, end):
+    """Walk the stay one minute at a time, finding each minute's price from the rules"""
+    offset = timedelta(minutes=rules.get('utc_offset_minutes', 0))
+    windows = []
+    for window in rules.get('windows', []):
+        days = [DAY_NAMES.index(day) for day in window.get('days', DAY_NAMES)]
+        start_h, start_m = map(int, window['start'].split(':'))
+        end_h, end_m = map(int, window['end'].split(':'))
+        windows.append((days, start_h * 60 + start_m, end_h * 60 + end_m, window['price']))
+
+    days_total = {}
+    moment = start + offset
+    local_end = end + offset
+    while moment < local_end:
+        step = min(timedelta(minutes=1) - timedelta(seconds=moment.second, microseconds=moment.microsecond),
+                   local_end - moment)
+        weekday, minute = moment.weekday(), moment.hour * 60 + moment.minute
+        rate = rules['weekend_price'] if weekday >= 5 and 'weekend_price' in rules else price
+        for days, first, last, window_price in windows:
+            if first < last:
+                inside = weekday in days and first <= minute < last
+            else:
+                # Past midnight: the tail belongs to the previous day's window
+                inside = (weekday in days and minute >= first) or ((weekday - 1) % 7 in days and minute < last)
+            if inside:
+                rate = window_price
+        days_total[moment.date()] = days_total.get(moment.date(), 0) + rate * step.total_seconds() / 3600
+        moment += step
+
+    cap = rules.get('daily_cap')
+    return sum(min(cap, total) if cap is not None else total for total in days_total.values())
+
+
+def bench_quotes(quotes, max_hours):
+    rng = random.Random(42)
+    origin = datetime(2026, 1, 1)
+    stays = []
+    for _ in range(quotes):
+        start = origin + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        stays.append((start, start + timedelta(seconds=rng.randrange(60, max_hours * 3600))))
+
+    started = time.perf_counter()
+    naive = [naive_cost(PRICE, RULES, start, end) for start, end in stays]
+    naive_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    table = compile_rules(PRICE, RULES)
+    compile_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    compiled = [table.cost(start, end) for start, end in stays]
+    compiled_time = time.perf_counter() - started
+
+    mismatches = sum(1 for a, b in zip(naive, compiled) if abs(a - b) >= 0.005)
+    print(f"Quotes ({quotes} stays up to {max_hours}h, {len(RULES['windows'])} windows, daily cap)")
+    print(f"  per-minute rules  {quotes / naive_time:12,.0f} quotes/s")
+    print(f"  rate table        {quotes / compiled_time:12,.0f} quotes/s  "
+          f"({naive_time / compiled_time:.0f}x, compiled once in {compile_time * 1000:.0f}ms)")
+    print(f"  {mismatches} quote(s) differ by more than a cent")
+
+
+def bench_repricing(reservations):
+    with temp_app_module() as app_module:
+        from models import db, User, ParkingLot, ParkingSpot, Reservation, bulk_create_spots, reprice_reservations
+
+        with app_module.app.app_context():
+            user = User(username='repricer', email='repricer@example.com', password_hash='-')
+            db.session.add(user)
+            for i in range(5):
+                lot = ParkingLot(
+                    prime_location_name=f'Lot {i}', price=PRICE + i, address='-', pin_code='000000',
+                    number_of_spots=50, available_count=50, occupied_count=0,
+                    pricing_rules=json.dumps(RULES, sort_keys=True)
+                )
+                db.session.add(lot)
+                db.session.flush()
+                bulk_create_spots(lot.id, 50)
+            db.session.commit()
+
+            spot_ids = [spot_id for (spot_id,) in db.session.query(ParkingSpot.id)]
+            rng = random.Random(7)
+            origin = datetime(2025, 1, 1)
+            rows = []
+            for _ in range(reservations):
+                parked = origin + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+                rows.append(dict(
+                    spot_id=rng.choice(spot_ids), user_id=user.id, status='completed',
+                    parking_timestamp=parked, leaving_timestamp=parked + timedelta(minutes=rng.randint(10, 2880)),
+                    parking_cost=0.0, created_at=parked
+                ))
+            db.session.execute(Reservation.__table__.insert(), rows)
+            db.session.commit()
+
+            started = time.perf_counter()
+            checked, changed = reprice_reservations()
+            elapsed = time.perf_counter() - started
+            print(f"\nBulk repricing ({reservations} completed reservations, 5 lots)")
+            print(f"  {checked} checked, {changed} updated in {elapsed:.2f}s ({checked / elapsed:,.0f} reservations/s)")
+
+            # The same table object is reused for every reservation of a lot
+            lot = ParkingLot.query.first()
+            assert rate_table(lot.id, lot.price, lot.pricing_rules) is rate_table(lot.id, lot.price, lot.pricing_rules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quotes', type=int, default=2000)
+    parser.add_argument('--max-hours', type=int, default=48)
+    parser.add_argument('--reservations', type=int, default=100000)
+    args = parser.parse_args()
+
+    bench_quotes(args.quotes, args.max_hours)
+    bench_repricing(args.reservations)
+
+
+if __name__ == '__main__':
+    main()
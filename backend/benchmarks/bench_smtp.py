@@ -0,0 +1,76 @@
+"""
+Mail delivery benchmark: one SMTP connection per message vs the pooled mailer
+
+Starts a local aiosmtpd server that accepts and discards mail, then sends the
+same reminder-sized messages with the old path (connect, send, quit for every
+message) and with SMTPMailer.send_batch() over one persistent session.
+aiosmtpd is only needed for this benchmark (pip install aiosmtpd).
+
+    python benchmarks/bench_smtp.py --messages 2000
+"""
+import argparse
+import smtplib
+import time
+from email.mime.text import MIMEText
+
+import common  # puts the backend modules on sys.path
+from aiosmtpd.controller import Controller
+from mailer import SMTPMailer
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 Message accepted for delivery'
+
+
+def make_messages(count):
+    messages = []
+    for i in range(count):
+        msg = MIMEText(f"Hello user{i},\n\nWe noticed you haven't booked a parking spot today.\n", 'plain')
+        msg['From'] = 'parking-system@localhost'
+        msg['To'] = f'user{i}@example.com'
+        msg['Subject'] = 'Parking Reminder - Book Your Spot Today!'
+        messages.append(msg)
+    return messages
+
+
+def send_per_connection(host, port, messages):
+    """The original send_email path: a new SMTP connection for every message"""
+    for msg in messages:
+        with smtplib.SMTP(host, port) as server:
+            server.send_message(msg)
+
+
+def run(mode, messages, host, port, handler):
+    handler.received = 0
+    started = time.perf_counter()
+    if mode == 'per-message':
+        send_per_connection(host, port, messages)
+    else:
+        mailer = SMTPMailer(host=host, port=port)
+        mailer.send_batch(messages, label='pooled')
+        mailer.close()
+    elapsed = time.perf_counter() - started
+    print(f"[{mode}] {len(messages)} messages in {elapsed:.2f}s "
+          f"({len(messages) / elapsed:.0f} msg/s), received {handler.received}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--port', type=int, default=8026)
+    args = parser.parse_args()
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+    try:
+        messages = make_messages(args.messages)
+        for mode in ('per-message', 'pooled'):
+            run(mode, messages, '127.0.0.1', args.port, handler)
+    finally:
+        controller.stop()
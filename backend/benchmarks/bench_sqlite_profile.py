@@ -0,0 +1,125 @@
+"""
+SQLite concurrency benchmark: default settings vs the sqlite_profile pragmas
+
+Each worker process loops book -> release against one lot for a fixed time,
+committing after every step like the API does. The 'default' run uses a plain
+SQLite engine with no retries; the 'profile' run applies apply_sqlite_profile()
+and wraps both steps in retry_on_locked(), as the book/release endpoints do.
+Reports cycles per second, cycle latency percentiles and 'database is locked'
+failures. Runs against throwaway SQLite files.
+
+    python benchmarks/bench_sqlite_profile.py --workers 16 --seconds 20
+"""
+import argparse
+import multiprocessing
+import time
+
+from common import make_app, remove_db, temp_db_path
+from models import db, User, ParkingLot, Reservation, bulk_create_spots
+from allocator import SpotAllocator
+from sqlite_profile import apply_sqlite_profile, is_database_locked, retry_on_locked
+
+
+def make_bench_app(db_path, profile):
+    app = make_app(db_path)
+    if profile:
+        with app.app_context():
+            apply_sqlite_profile(db.engine)
+    return app
+
+
+def seed(app, workers, spots):
+    with app.app_context():
+        db.create_all()
+        lot = ParkingLot(
+            prime_location_name='Bench Lot', price=10.0, address='-', pin_code='000000',
+            number_of_spots=spots, available_count=spots, occupied_count=0
+        )
+        db.session.add(lot)
+        users = [User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='-') for i in range(workers)]
+        db.session.add_all(users)
+        db.session.flush()
+        bulk_create_spots(lot.id, spots)
+        db.session.commit()
+        return lot.id, [user.id for user in users]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def worker(mode, db_path, lot_id, user_id, seconds):
+    """One process looping book -> release; returns (latencies, locked, other_errors)"""
+    profile = mode == 'profile'
+    app = make_bench_app(db_path, profile)
+    allocator = SpotAllocator()
+
+    def book():
+        spot = allocator.claim(lot_id)
+        reservation = Reservation(spot_id=spot.id, user_id=user_id, status='active')
+        db.session.add(reservation)
+        db.session.commit()
+        return reservation.id
+
+    def release(reservation_id):
+        reservation = db.session.get(Reservation, reservation_id)
+        reservation.complete_reservation()
+        db.session.commit()
+        allocator.release(reservation.parking_spot)
+
+    if profile:
+        book, release = retry_on_locked()(book), retry_on_locked()(release)
+
+    latencies, locked, other_errors = [], 0, 0
+    deadline = time.perf_counter() + seconds
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                release(book())
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                db.session.rollback()
+                if is_database_locked(e):
+                    locked += 1
+                else:
+                    other_errors += 1
+            finally:
+                db.session.remove()
+    return latencies, locked, other_errors
+
+
+def run(mode, workers, seconds, spots):
+    db_path = temp_db_path()
+    app = make_bench_app(db_path, mode == 'profile')
+    lot_id, user_ids = seed(app, workers, spots)
+    with app.app_context():
+        db.engine.dispose()
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.starmap(worker, [(mode, db_path, lot_id, user_id, seconds) for user_id in user_ids])
+    elapsed = time.perf_counter() - started
+
+    remove_db(db_path)
+
+    cycles = [latency for latencies, _, _ in results for latency in latencies]
+    print(f"[{mode}] {workers} worker processes, {elapsed:.1f}s")
+    print(f"  book+release cycles : {len(cycles)} ({len(cycles) / elapsed:.0f}/s)")
+    print(f"  latency p50 / p99   : {percentile(cycles, 0.5) * 1000:.1f} ms / {percentile(cycles, 0.99) * 1000:.1f} ms")
+    print(f"  cycles over 1s      : {sum(1 for latency in cycles if latency > 1)}")
+    print(f"  'database is locked': {sum(locked for _, locked, _ in results)}")
+    print(f"  other failures      : {sum(errors for _, _, errors in results)}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--spots', type=int, default=1000)
+    args = parser.parse_args()
+
+    for mode in ('default', 'profile'):
+        run(mode, args.workers, args.seconds, args.spots)
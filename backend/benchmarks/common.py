@@ -0,0 +1,52 @@
+"""Shared benchmark setup: backend imports and throwaway SQLite databases"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from flask import Flask
+from models import db
+
+
+def temp_db_path():
+    """Path for a throwaway SQLite file, so a benchmark never touches instance/parking_app.db"""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.remove(path)
+    return path
+
+
+def remove_db(path):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def make_app(database, engine_options=None, config=None):
+    """Bare Flask app with only the models bound; database is a SQLite file path or a database URL"""
+    app = Flask(__name__, template_folder=os.path.join(BACKEND_DIR, 'templates'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = database if '://' in database else f'sqlite:///{database}'
+    if engine_options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    app.config.update(config or {})
+    db.init_app(app)
+    return app
+
+
+@contextmanager
+def temp_app_module(**environ):
+    """The full app module (blueprints, caches, migrations) on a throwaway SQLite database"""
+    path = temp_db_path()
+    # app.py reads its settings from the environment at import
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.update(environ)
+    try:
+        import app as app_module
+        app_module.init_database()
+        yield app_module
+    finally:
+        remove_db(path)
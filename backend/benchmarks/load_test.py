@@ -0,0 +1,173 @@
+"""
+HTTP load test for a running backend
+
+Logs in as the admin and a set of regular users, optionally opens N idle SSE
+availability streams (to check that held connections don't starve the server),
+then runs concurrent request loops against the main endpoints and reports
+requests per second and p50/p99 latency per endpoint.
+
+    python serve.py --workers 2                        # in one terminal
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --concurrency 32 --seconds 20 --sse-clients 200
+
+Regular users are registered on the fly (loadtest_<n>), so point it at a
+disposable database.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+
+class Client:
+    """One keep-alive HTTP connection with a session cookie"""
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        self.cookie = None
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Server closed the keep-alive connection: reconnect once
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+        data = response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, data
+
+    def login(self, username, password):
+        status, _ = self.request('POST', '/api/auth/login', {'username': username, 'password': password})
+        return status == 200
+
+
+def open_sse_streams(url, count, cookie):
+    """Open count availability streams and keep them open (reading) in daemon threads"""
+    parsed = urlparse(url)
+    opened = []
+
+    def hold():
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=None)
+        conn.request('GET', '/api/user/availability/stream', headers={'Cookie': cookie})
+        response = conn.getresponse()
+        opened.append(response.status)
+        while response.read(1):
+            pass
+
+    for _ in range(count):
+        threading.Thread(target=hold, daemon=True).start()
+    deadline = time.time() + 30
+    while len(opened) < count and time.time() < deadline:
+        time.sleep(0.1)
+    return sum(1 for status in opened if status == 200)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--sse-clients', type=int, default=0)
+    parser.add_argument('--admin', default='admin:admin123', help='username:password')
+    args = parser.parse_args()
+
+    admin_user, admin_password = args.admin.split(':', 1)
+    admin = Client(args.url)
+    if not admin.login(admin_user, admin_password):
+        raise SystemExit('Admin login failed')
+    status, data = admin.request('GET', '/api/admin/parking-lots')
+    lots = [lot['id'] for lot in json.loads(data)['parking_lots'] if lot['available_spots'] > 0]
+    if not lots:
+        status, data = admin.request('POST', '/api/admin/parking-lots', {
+            'name': 'Load test lot', 'price': 20, 'address': 'Load test', 'pin_code': '000000',
+            'number_of_spots': max(args.concurrency, 10)
+        })
+        if status != 201:
+            raise SystemExit(f'No parking lot with free spots and creating one failed: {data[:200]}')
+        lots = [json.loads(data)['parking_lot']['id']]
+
+    if args.sse_clients:
+        held = open_sse_streams(args.url, args.sse_clients, admin.cookie)
+        print(f"Holding {held}/{args.sse_clients} SSE streams open")
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    record_lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def timed(client, name, method, path, body=None, expect=(200,)):
+        started = time.perf_counter()
+        try:
+            status, data = client.request(method, path, body)
+        except Exception:
+            status, data = None, b''
+        elapsed = time.perf_counter() - started
+        with record_lock:
+            if status in expect:
+                latencies[name].append(elapsed)
+            else:
+                errors[name] += 1
+        return status, data
+
+    def loop(index):
+        client = Client(args.url)
+        username = f'loadtest_{index}'
+        client.request('POST', '/api/auth/register', {
+            'username': username, 'email': f'{username}@example.com', 'password': 'loadtest'
+        })
+        if not client.login(username, 'loadtest'):
+            with record_lock:
+                errors['login'] += 1
+            return
+        admin_client = Client(args.url)
+        admin_client.login(admin_user, admin_password)
+
+        lot_id = lots[index % len(lots)]
+        while time.perf_counter() < deadline:
+            timed(client, 'GET /api/user/parking-lots/available', 'GET', '/api/user/parking-lots/available')
+            timed(client, 'GET /api/user/dashboard', 'GET', '/api/user/dashboard')
+            timed(admin_client, 'GET /api/admin/dashboard', 'GET', '/api/admin/dashboard')
+            status, data = timed(client, 'POST /api/user/book-spot', 'POST', '/api/user/book-spot',
+                                 {'lot_id': lot_id}, expect=(201,))
+            if status == 201:
+                reservation_id = json.loads(data)['reservation']['id']
+                timed(client, 'POST /api/user/release-spot', 'POST', f'/api/user/release-spot/{reservation_id}')
+
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{args.concurrency} clients, {elapsed:.1f}s, {total} requests ({total / elapsed:.0f} req/s)")
+    print(f"{'endpoint':40} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name in sorted(set(latencies) | set(errors)):
+        values = latencies[name]
+        print(f"{name:40} {len(values) / elapsed:7.1f} {percentile(values, 0.5) * 1000:8.1f} "
+              f"{percentile(values, 0.99) * 1000:8.1f} {errors[name]:7d}")
+
+
+if __name__ == '__main__':
+    main()
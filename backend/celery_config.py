@@ -1,6 +1,15 @@
 from celery import Celery
 from celery.schedules import crontab
 
+def cron_schedule(expression):
+    """crontab from a five-field cron expression, e.g. '0 18 * * *' for daily at 18:00"""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Expected 5 cron fields, got {expression!r}")
+    minute, hour, day_of_month, month_of_year, day_of_week = fields
+    return crontab(minute=minute, hour=hour, day_of_month=day_of_month,
+                   month_of_year=month_of_year, day_of_week=day_of_week)
+
 def make_celery(app):
     celery = Celery(
         app.import_name,
@@ -13,11 +22,15 @@ def make_celery(app):
     celery.conf.beat_schedule = {
         'send-daily-reminders': {
             'task': 'tasks.send_daily_reminder',
-            'schedule': crontab(minute='*'),
+            'schedule': cron_schedule(app.config.get('REMINDER_SCHEDULE', '0 18 * * *')),
         },
         'generate-monthly-reports': {
             'task': 'tasks.generate_monthly_report',
-            'schedule': crontab(minute='*'),
+            'schedule': cron_schedule(app.config.get('MONTHLY_REPORT_SCHEDULE', '0 9 1 * *')),
+        },
+        'purge-old-exports': {
+            'task': 'tasks.purge_old_exports',
+            'schedule': cron_schedule(app.config.get('EXPORT_PURGE_SCHEDULE', '30 3 * * *')),
         },
     }
     
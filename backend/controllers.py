@@ -1,12 +1,29 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, make_response, current_app, send_from_directory, stream_with_context
 from flask_login import login_required, current_user
-from models import db, User, ParkingLot, ParkingSpot, Reservation
+from models import (
+    db, User, ParkingLot, ParkingSpot, Reservation, LotDailyStat, UserMonthlyStat,
+    bulk_create_spots, bulk_delete_lot, generate_spot_numbers, section_label, remove_lot_rollups,
+    reservation_hours_expr
+)
 from auth import admin_required, user_required
-from datetime import datetime, timezone
-from sqlalchemy import func
+from sqlite_profile import is_database_locked, retry_on_locked
+from exports import iter_history_csv, is_user_export
+from availability import lot_availability_event, lot_deleted_event, sse_stream
+from pricing import parse_pricing_rules, invalidate_lot_pricing, quote
+import principals
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, and_, or_, case
+from functools import wraps
+import hashlib
+import json
+import os
+import time
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
+# Multi-storey facilities can run to tens of thousands of spots
+MAX_SPOTS_PER_LOT = 100000
+
 # Import cache from app (will be set after app initialization)
 cache = None
 
@@ -14,6 +31,32 @@ def init_cache(cache_instance):
     global cache
     cache = cache_instance
 
+# Free-spot allocator (set after app initialization)
+spot_allocator = None
+
+def init_allocator(allocator_instance):
+    global spot_allocator
+    spot_allocator = allocator_instance
+
+# Live availability broker for SSE clients (set after app initialization)
+availability_broker = None
+
+def init_availability(broker_instance):
+    global availability_broker
+    availability_broker = broker_instance
+
+def publish_availability(lot_id, change):
+    """Push a lot's new counts to connected SSE clients; never fails the request that triggered it"""
+    try:
+        if availability_broker:
+            if change == 'deleted':
+                availability_broker.publish(lot_deleted_event(lot_id))
+            else:
+                lot = db.session.get(ParkingLot, lot_id)
+                availability_broker.publish(lot_availability_event(lot, change))
+    except Exception as e:
+        print(f"Failed to publish availability for lot {lot_id}: {e}")
+
 # Helper function to use cache safely
 def safe_cache_get(key, default=None):
     """Safely get from cache, return default if cache not available"""
@@ -40,32 +83,117 @@ def safe_cache_delete(key):
     except:
         pass
 
+def safe_cache_inc(key):
+    """Safely increment a counter in cache, ignore if cache not available"""
+    try:
+        if cache:
+            cache.cache.inc(key)  # Backend-level inc is an atomic INCR on Redis
+    except:
+        pass
+
+# ============= RESPONSE CACHING =============
+# Cached responses are keyed by a per-namespace version token. Writes bump the
+# token of every namespace they affect, so stale entries are never read again
+# and simply age out; the TTL is only a backstop.
+
+CACHE_NAMESPACES = ('lots', 'dashboard', 'charts')
+CACHED_ENDPOINTS = ('available_lots', 'admin_dashboard', 'admin_lots', 'admin_charts')
+
+def _cache_version(namespace):
+    key = f'cache_version:{namespace}'
+    version = safe_cache_get(key)
+    if version is None:
+        # Never seen (or evicted): start a fresh token rather than reusing an old one
+        version = str(time.time_ns())
+        safe_cache_set(key, version, timeout=0)
+    return version
+
+def invalidate_cache(*namespaces):
+    """Bump the version of each namespace so entries cached before this write are skipped"""
+    for namespace in namespaces or CACHE_NAMESPACES:
+        safe_cache_set(f'cache_version:{namespace}', str(time.time_ns()), timeout=0)
+
+def cached_response(name, namespaces, timeout=60):
+    """
+    Cache a view's successful JSON body under versioned keys, counting hits and misses.
+    Responses carry an ETag, so polling clients sending If-None-Match get a 304 when nothing changed.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            versions = ':'.join(_cache_version(namespace) for namespace in namespaces)
+            key = f'response:{name}:{versions}:{request.full_path}'
+            
+            cached = safe_cache_get(key)
+            if cached is not None:
+                safe_cache_inc(f'cache_stats:{name}:hits')
+                body, etag = cached
+                response = Response(body, status=200, mimetype='application/json')
+            else:
+                safe_cache_inc(f'cache_stats:{name}:misses')
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                etag = hashlib.md5(response.get_data()).hexdigest()
+                safe_cache_set(key, (response.get_data(), etag), timeout=timeout)
+            
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+        return decorated_function
+    return decorator
+
 @admin_bp.route('/dashboard', methods=['GET'])
 @admin_required
+@cached_response('admin_dashboard', ('dashboard',))
 def admin_dashboard():
     try:
-        total_lots = ParkingLot.query.count()
-        total_spots = ParkingSpot.query.count()
-        available_spots = ParkingSpot.query.filter_by(status='A').count()
-        occupied_spots = ParkingSpot.query.filter_by(status='O').count()
-        total_users = User.query.filter_by(is_admin=False).count()
-        active_reservations = Reservation.query.filter_by(status='active').count()
-        completed_reservations = Reservation.query.filter_by(status='completed').count()
-        
-        recent_reservations = Reservation.query.order_by(
-            Reservation.created_at.desc()
-        ).limit(10).all()
+        def total(column, *criteria):
+            return db.select(column).where(*criteria).scalar_subquery()
+        
+        # Every dashboard count in a single statement, one scalar subquery each
+        counts = db.session.execute(db.select(
+            total(func.count(ParkingLot.id)).label('lots'),
+            total(func.coalesce(func.sum(ParkingLot.available_count), 0)).label('available'),
+            total(func.coalesce(func.sum(ParkingLot.occupied_count), 0)).label('occupied'),
+            total(func.count(User.id), User.is_admin == False).label('users'),
+            total(func.count(Reservation.id), Reservation.status == 'active').label('active'),
+            total(func.count(Reservation.id), Reservation.status == 'completed').label('completed')
+        )).one()
+        total_lots = counts.lots
+        available_spots = counts.available
+        occupied_spots = counts.occupied
+        total_spots = available_spots + occupied_spots
+        total_users = counts.users
+        active_reservations = counts.active
+        completed_reservations = counts.completed
+        
+        recent_reservations = db.session.execute(
+            db.select(
+                Reservation.id, User.username, ParkingLot.prime_location_name, ParkingSpot.spot_number,
+                Reservation.status, Reservation.parking_timestamp, Reservation.parking_cost,
+                reservation_hours_expr().label('duration_hours')
+            ).join(
+                User, User.id == Reservation.user_id
+            ).join(
+                ParkingSpot, ParkingSpot.id == Reservation.spot_id
+            ).join(
+                ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+            ).order_by(
+                Reservation.created_at.desc()
+            ).limit(10)
+        ).all()
         
         recent_data = []
         for res in recent_reservations:
             recent_data.append({
                 'id': res.id,
-                'user': res.user.username,
-                'parking_lot': res.parking_spot.parking_lot.prime_location_name,
-                'spot': res.parking_spot.spot_number,
+                'user': res.username,
+                'parking_lot': res.prime_location_name,
+                'spot': res.spot_number,
                 'status': res.status,
                 'parking_time': res.parking_timestamp.isoformat(),
-                'duration': res.get_duration_hours() if res.status == 'active' else None,
+                'duration': round(res.duration_hours, 2) if res.status == 'active' else None,
                 'cost': res.parking_cost
             })
         
@@ -103,6 +231,7 @@ def admin_dashboard():
 
 @admin_bp.route('/parking-lots', methods=['GET'])
 @admin_required
+@cached_response('admin_lots', ('lots',))
 def get_all_parking_lots():
     try:
         lots = ParkingLot.query.all()
@@ -119,6 +248,7 @@ def get_all_parking_lots():
                 'available_spots': lot.get_available_spots_count(),
                 'occupied_spots': lot.get_occupied_spots_count(),
                 'description': lot.description,
+                'pricing_rules': json.loads(lot.pricing_rules) if lot.pricing_rules else None,
                 'created_at': lot.created_at.isoformat()
             })
         
@@ -149,10 +279,20 @@ def create_parking_lot():
                     'message': f'Missing required field: {field}'
                 }), 400
         
-        if data['number_of_spots'] <= 0 or data['number_of_spots'] > 1000:
+        if data['number_of_spots'] <= 0 or data['number_of_spots'] > MAX_SPOTS_PER_LOT:
             return jsonify({
                 'status': 'error',
-                'message': 'Number of spots must be between 1 and 1000'
+                'message': f'Number of spots must be between 1 and {MAX_SPOTS_PER_LOT}'
+            }), 400
+        
+        num_spots = int(data['number_of_spots'])
+        
+        try:
+            pricing_rules = parse_pricing_rules(data.get('pricing_rules'))
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': f'Invalid pricing rules: {str(e)}'
             }), 400
         
         new_lot = ParkingLot(
@@ -160,46 +300,32 @@ def create_parking_lot():
             price=float(data['price']),
             address=data['address'],
             pin_code=data['pin_code'],
-            number_of_spots=int(data['number_of_spots']),
-            description=data.get('description', '')
+            number_of_spots=num_spots,
+            available_count=num_spots,
+            occupied_count=0,
+            description=data.get('description', ''),
+            pricing_rules=pricing_rules
         )
         
         db.session.add(new_lot)
         db.session.flush()  # Get the lot ID before creating spots
         
-        spots_created = []
-        num_spots = int(data['number_of_spots'])
-        
-        section_size = 100
-        sections = (num_spots + section_size - 1) // section_size  # Ceiling division
-        
-        spot_number = 1
-        for section_idx in range(sections):
-            section_letter = chr(65 + section_idx)  # A, B, C, etc.
-            
-            remaining_spots = num_spots - (section_idx * section_size)
-            spots_in_section = min(section_size, remaining_spots)
-            
-            for i in range(1, spots_in_section + 1):
-                spot = ParkingSpot(
-                    lot_id=new_lot.id,
-                    spot_number=f"{section_letter}-{i:02d}",  # e.g., A-01, A-02
-                    status='A',  # Available
-                    vehicle_type='4-wheeler'
-                )
-                db.session.add(spot)
-                spots_created.append(spot.spot_number)
-        
+        # Spots are numbered in sections of 100: A-01 ... A-100, B-01 ...
+        bulk_create_spots(new_lot.id, num_spots)
         db.session.commit()
+        invalidate_cache('lots', 'dashboard', 'charts')
+        publish_availability(new_lot.id, 'created')
+        
+        spots_created = list(generate_spot_numbers(min(num_spots, 10)))
         
         return jsonify({
             'status': 'success',
-            'message': f'Parking lot created with {len(spots_created)} spots',
+            'message': f'Parking lot created with {num_spots} spots',
             'parking_lot': {
                 'id': new_lot.id,
                 'name': new_lot.prime_location_name,
                 'total_spots': new_lot.number_of_spots,
-                'spots_created': spots_created[:10] + ['...'] if len(spots_created) > 10 else spots_created
+                'spots_created': spots_created + ['...'] if num_spots > 10 else spots_created
             }
         }), 201
         
@@ -213,6 +339,10 @@ def create_parking_lot():
 @admin_bp.route('/parking-lots/<int:lot_id>', methods=['GET'])
 @admin_required
 def get_parking_lot(lot_id):
+    """
+    Lot details with its spots. Optional query params:
+    status (A/O), section (A, B, ...), page and per_page for server-side paging.
+    """
     try:
         lot = ParkingLot.query.get(lot_id)
         
@@ -222,45 +352,96 @@ def get_parking_lot(lot_id):
                 'message': 'Parking lot not found'
             }), 404
         
+        status = request.args.get('status')
+        section = request.args.get('section')
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', default=200, type=int)
+        
+        if status and status not in ('A', 'O'):
+            return jsonify({
+                'status': 'error',
+                'message': 'status must be A or O'
+            }), 400
+        if page is not None and (page < 1 or per_page < 1 or per_page > 1000):
+            return jsonify({
+                'status': 'error',
+                'message': 'page must be >= 1 and per_page between 1 and 1000'
+            }), 400
+        
+        # Spots LEFT JOIN their active reservation and its user in one round trip
+        spots_query = db.session.query(
+            ParkingSpot.id,
+            ParkingSpot.spot_number,
+            ParkingSpot.status,
+            ParkingSpot.vehicle_type,
+            Reservation.vehicle_number,
+            Reservation.parking_timestamp,
+            User.username
+        ).outerjoin(
+            Reservation,
+            and_(Reservation.spot_id == ParkingSpot.id, Reservation.status == 'active')
+        ).outerjoin(
+            User, User.id == Reservation.user_id
+        ).filter(ParkingSpot.lot_id == lot.id)
+        
+        if status:
+            spots_query = spots_query.filter(ParkingSpot.status == status)
+        if section:
+            spots_query = spots_query.filter(ParkingSpot.spot_number.like(f'{section.upper()}-%'))
+        
+        pagination = None
+        if page is not None:
+            total = spots_query.order_by(None).count()
+            spots_query = spots_query.order_by(ParkingSpot.id).offset((page - 1) * per_page).limit(per_page)
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page
+            }
+        else:
+            spots_query = spots_query.order_by(ParkingSpot.id)
+        
+        now = datetime.utcnow()
         spots = []
-        for spot in lot.parking_spots:
+        for spot_id, spot_number, spot_status, vehicle_type, vehicle_number, parked_since, username in spots_query:
             spot_info = {
-                'id': spot.id,
-                'spot_number': spot.spot_number,
-                'status': spot.status,
-                'vehicle_type': spot.vehicle_type
+                'id': spot_id,
+                'spot_number': spot_number,
+                'status': spot_status,
+                'vehicle_type': vehicle_type
             }
             
-            if spot.status == 'O':
-                active_reservation = Reservation.query.filter_by(
-                    spot_id=spot.id,
-                    status='active'
-                ).first()
-                
-                if active_reservation:
-                    spot_info['reservation'] = {
-                        'user': active_reservation.user.username,
-                        'vehicle_number': active_reservation.vehicle_number,
-                        'parked_since': active_reservation.parking_timestamp.isoformat(),
-                        'duration_hours': active_reservation.get_duration_hours()
-                    }
+            if spot_status == 'O' and parked_since is not None:
+                spot_info['reservation'] = {
+                    'user': username,
+                    'vehicle_number': vehicle_number,
+                    'parked_since': parked_since.isoformat(),
+                    'duration_hours': round((now - parked_since).total_seconds() / 3600, 2)
+                }
             
             spots.append(spot_info)
         
+        lot_data = {
+            'id': lot.id,
+            'name': lot.prime_location_name,
+            'price': lot.price,
+            'address': lot.address,
+            'pin_code': lot.pin_code,
+            'total_spots': lot.number_of_spots,
+            'available_spots': lot.get_available_spots_count(),
+            'occupied_spots': lot.get_occupied_spots_count(),
+            'description': lot.description,
+            'pricing_rules': json.loads(lot.pricing_rules) if lot.pricing_rules else None,
+            'sections': [section_label(i) for i in range((lot.number_of_spots + 99) // 100)],
+            'spots': spots
+        }
+        if pagination:
+            lot_data['pagination'] = pagination
+        
         return jsonify({
             'status': 'success',
-            'parking_lot': {
-                'id': lot.id,
-                'name': lot.prime_location_name,
-                'price': lot.price,
-                'address': lot.address,
-                'pin_code': lot.pin_code,
-                'total_spots': lot.number_of_spots,
-                'available_spots': lot.get_available_spots_count(),
-                'occupied_spots': lot.get_occupied_spots_count(),
-                'description': lot.description,
-                'spots': spots
-            }
+            'parking_lot': lot_data
         }), 200
         
     except Exception as e:
@@ -293,9 +474,22 @@ def update_parking_lot(lot_id):
             lot.pin_code = data['pin_code']
         if 'description' in data:
             lot.description = data['description']
+        if 'pricing_rules' in data:
+            try:
+                lot.pricing_rules = parse_pricing_rules(data['pricing_rules'])
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({
+                    'status': 'error',
+                    'message': f'Invalid pricing rules: {str(e)}'
+                }), 400
         
         lot.updated_at = datetime.now(timezone.utc)
         db.session.commit()
+        invalidate_cache('lots', 'dashboard', 'charts')
+        # Other processes recompile on their own: cached rate tables are keyed on the price and rules
+        invalidate_lot_pricing(lot.id)
+        publish_availability(lot.id, 'updated')
         
         return jsonify({
             'status': 'success',
@@ -303,7 +497,8 @@ def update_parking_lot(lot_id):
             'parking_lot': {
                 'id': lot.id,
                 'name': lot.prime_location_name,
-                'price': lot.price
+                'price': lot.price,
+                'pricing_rules': json.loads(lot.pricing_rules) if lot.pricing_rules else None
             }
         }), 200
         
@@ -336,8 +531,14 @@ def delete_parking_lot(lot_id):
             }), 400
         
         lot_name = lot.prime_location_name
-        db.session.delete(lot)
+        remove_lot_rollups(lot.id)
+        db.session.expunge(lot)
+        bulk_delete_lot(lot_id)
         db.session.commit()
+        spot_allocator.forget(lot_id)
+        invalidate_lot_pricing(lot_id)
+        invalidate_cache('lots', 'dashboard', 'charts')
+        publish_availability(lot_id, 'deleted')
         
         return jsonify({
             'status': 'success',
@@ -356,14 +557,82 @@ def delete_parking_lot(lot_id):
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_all_users():
+    """
+    Keyset-paginated user listing. Optional query params:
+    q (username/email prefix), sort (id or reservations), limit, cursor (next_cursor of the previous page).
+    """
     try:
-        users = User.query.filter_by(is_admin=False).all()
+        search = request.args.get('q', '').strip()
+        sort = request.args.get('sort', 'id')
+        limit = request.args.get('limit', default=50, type=int)
+        cursor = request.args.get('cursor')
+        
+        if sort not in ('id', 'reservations'):
+            return jsonify({
+                'status': 'error',
+                'message': 'sort must be id or reservations'
+            }), 400
+        if limit < 1 or limit > 500:
+            return jsonify({
+                'status': 'error',
+                'message': 'limit must be between 1 and 500'
+            }), 400
+        
+        # Reservation counts for every user in one grouped pass
+        stats = db.session.query(
+            Reservation.user_id.label('user_id'),
+            func.count(Reservation.id).label('total'),
+            func.sum(case((Reservation.status == 'active', 1), else_=0)).label('active')
+        ).group_by(Reservation.user_id).subquery()
+        
+        total_reservations = func.coalesce(stats.c.total, 0)
+        active_reservations = func.coalesce(stats.c.active, 0)
+        
+        base_query = db.session.query(User).outerjoin(
+            stats, stats.c.user_id == User.id
+        ).filter(User.is_admin == False)
+        
+        if search:
+            # Range predicates instead of LIKE so the unique username/email indexes serve the prefix match
+            upper = search[:-1] + chr(ord(search[-1]) + 1)
+            base_query = base_query.filter(or_(
+                and_(User.username >= search, User.username < upper),
+                and_(User.email >= search, User.email < upper)
+            ))
+        
+        summary = base_query.with_entities(
+            func.count(User.id),
+            func.sum(case((User.is_active == True, 1), else_=0)),
+            func.sum(total_reservations)
+        ).one()
+        
+        page_query = base_query.with_entities(User, total_reservations, active_reservations)
+        
+        try:
+            if sort == 'reservations':
+                if cursor:
+                    after_count, after_id = (int(part) for part in cursor.split(':'))
+                    page_query = page_query.filter(or_(
+                        total_reservations < after_count,
+                        and_(total_reservations == after_count, User.id > after_id)
+                    ))
+                page_query = page_query.order_by(total_reservations.desc(), User.id)
+            else:
+                if cursor:
+                    page_query = page_query.filter(User.id > int(cursor))
+                page_query = page_query.order_by(User.id)
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid cursor'
+            }), 400
+        
+        rows = page_query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         users_data = []
-        for user in users:
-            total_reservations = Reservation.query.filter_by(user_id=user.id).count()
-            active_reservations = Reservation.query.filter_by(user_id=user.id, status='active').count()
-            
+        for user, total, active in rows:
             users_data.append({
                 'id': user.id,
                 'username': user.username,
@@ -371,14 +640,24 @@ def get_all_users():
                 'phone_number': user.phone_number,
                 'is_active': user.is_active,
                 'created_at': user.created_at.isoformat(),
-                'total_reservations': total_reservations,
-                'active_reservations': active_reservations
+                'total_reservations': int(total),
+                'active_reservations': int(active)
             })
         
+        next_cursor = None
+        if has_more:
+            last = users_data[-1]
+            next_cursor = f"{last['total_reservations']}:{last['id']}" if sort == 'reservations' else str(last['id'])
+        
         return jsonify({
             'status': 'success',
             'users': users_data,
-            'total': len(users_data)
+            'total': summary[0],
+            'summary': {
+                'active_users': int(summary[1] or 0),
+                'total_reservations': int(summary[2] or 0)
+            },
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -389,27 +668,72 @@ def get_all_users():
 
 # ============= CHARTS & STATISTICS =============
 
+def _time_bucket(column, bucket):
+    """SQL expression truncating a timestamp to the start of its hour/day/week"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.to_char(func.date_trunc(bucket, column), 'YYYY-MM-DD HH24:MI:SS')
+    if bucket == 'hour':
+        return func.strftime('%Y-%m-%d %H:00:00', column)
+    if bucket == 'week':
+        # Monday of the week containing the timestamp
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.date(column)
+
+def _parse_chart_window(args):
+    """Returns (start, end, bucket) for the optional from/to/bucket params, or None if absent"""
+    if not any(key in args for key in ('from', 'to', 'bucket')):
+        return None
+    
+    bucket = args.get('bucket', 'day')
+    if bucket not in ('hour', 'day', 'week'):
+        raise ValueError('bucket must be hour, day or week')
+    
+    end = datetime.fromisoformat(args['to']) if args.get('to') else datetime.utcnow()
+    start = datetime.fromisoformat(args['from']) if args.get('from') else end - timedelta(days=30)
+    if start >= end:
+        raise ValueError('from must be before to')
+    return start, end, bucket
+
 @admin_bp.route('/charts/parking-lots', methods=['GET'])
 @admin_required
+@cached_response('admin_charts', ('charts',))
 def get_parking_lot_charts():
+    """
+    Per-lot occupancy and revenue. With from/to (ISO dates, to exclusive) and/or
+    bucket=hour|day|week it also returns per-lot completed booking and revenue time series.
+    """
     try:
-        lots = ParkingLot.query.all()
+        try:
+            window = _parse_chart_window(request.args)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+        
+        revenue_by_lot = db.session.query(
+            LotDailyStat.lot_id.label('lot_id'),
+            func.sum(LotDailyStat.revenue).label('revenue')
+        ).group_by(LotDailyStat.lot_id).subquery()
+        
+        # Spot totals come from the maintained lot counters, revenue from the daily rollups
+        lots = db.session.query(
+            ParkingLot.id,
+            ParkingLot.prime_location_name,
+            ParkingLot.number_of_spots,
+            ParkingLot.occupied_count,
+            func.coalesce(revenue_by_lot.c.revenue, 0)
+        ).outerjoin(
+            revenue_by_lot, revenue_by_lot.c.lot_id == ParkingLot.id
+        ).order_by(ParkingLot.id).all()
         
         chart_data = []
-        for lot in lots:
-            total_spots = lot.number_of_spots
-            occupied = lot.get_occupied_spots_count()
+        for lot_id, name, total_spots, occupied, revenue in lots:
             occupancy_rate = (occupied / total_spots * 100) if total_spots > 0 else 0
             
-            revenue = db.session.query(func.sum(Reservation.parking_cost)).join(
-                ParkingSpot
-            ).filter(
-                ParkingSpot.lot_id == lot.id,
-                Reservation.status == 'completed'
-            ).scalar() or 0
-            
             chart_data.append({
-                'name': lot.prime_location_name,
+                'id': lot_id,
+                'name': name,
                 'total_spots': total_spots,
                 'occupied_spots': occupied,
                 'available_spots': total_spots - occupied,
@@ -417,10 +741,60 @@ def get_parking_lot_charts():
                 'revenue': round(float(revenue), 2)
             })
         
-        return jsonify({
+        response_data = {
             'status': 'success',
             'charts': chart_data
-        }), 200
+        }
+        
+        if window:
+            start, end, bucket = window
+            
+            if bucket == 'hour':
+                # Finer than the daily rollups, so read the raw reservations
+                period = _time_bucket(Reservation.parking_timestamp, bucket)
+                rows = db.session.query(
+                    ParkingSpot.lot_id,
+                    period.label('period'),
+                    func.count(Reservation.id),
+                    func.coalesce(func.sum(Reservation.parking_cost), 0)
+                ).join(
+                    ParkingSpot, ParkingSpot.id == Reservation.spot_id
+                ).filter(
+                    Reservation.status == 'completed',
+                    Reservation.parking_timestamp >= start,
+                    Reservation.parking_timestamp < end
+                ).group_by(ParkingSpot.lot_id, period).order_by(ParkingSpot.lot_id, period).all()
+            else:
+                period = _time_bucket(LotDailyStat.day, bucket)
+                rows = db.session.query(
+                    LotDailyStat.lot_id,
+                    period.label('period'),
+                    func.sum(LotDailyStat.reservations),
+                    func.sum(LotDailyStat.revenue)
+                ).filter(
+                    LotDailyStat.day >= start.date(),
+                    LotDailyStat.day <= (end - timedelta(microseconds=1)).date()
+                ).group_by(LotDailyStat.lot_id, period).order_by(LotDailyStat.lot_id, period).all()
+            
+            points_by_lot = {}
+            for lot_id, period_start, bookings, revenue in rows:
+                points_by_lot.setdefault(lot_id, []).append({
+                    'period': str(period_start),
+                    'bookings': bookings,
+                    'revenue': round(float(revenue), 2)
+                })
+            
+            response_data['time_series'] = {
+                'from': start.isoformat(),
+                'to': end.isoformat(),
+                'bucket': bucket,
+                'series': [
+                    {'lot_id': lot['id'], 'name': lot['name'], 'points': points_by_lot.get(lot['id'], [])}
+                    for lot in chart_data
+                ]
+            }
+        
+        return jsonify(response_data), 200
         
     except Exception as e:
         return jsonify({
@@ -428,6 +802,127 @@ def get_parking_lot_charts():
             'message': f'Failed to generate charts: {str(e)}'
         }), 500
 
+@admin_bp.route('/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Hit/miss counters of the cached read endpoints and of this process's session user cache"""
+    stats = {}
+    for name in CACHED_ENDPOINTS:
+        hits = int(safe_cache_get(f'cache_stats:{name}:hits') or 0)
+        misses = int(safe_cache_get(f'cache_stats:{name}:misses') or 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None
+        }
+    
+    return jsonify({
+        'status': 'success',
+        'cache_stats': stats,
+        'user_principals': principals.principal_cache.stats() if principals.principal_cache else None
+    }), 200
+
+@admin_bp.route('/export-reservations', methods=['POST'])
+@admin_required
+def export_reservations():
+    """Start a full reservation export for a date range (from required, to defaults to now)"""
+    try:
+        from tasks import export_all_reservations
+        
+        data = request.get_json() or {}
+        if not data.get('from'):
+            return jsonify({
+                'status': 'error',
+                'message': 'from is required'
+            }), 400
+        
+        try:
+            start = datetime.fromisoformat(data['from'])
+            end = datetime.fromisoformat(data['to']) if data.get('to') else datetime.utcnow()
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': 'from and to must be ISO dates'
+            }), 400
+        if start >= end:
+            return jsonify({
+                'status': 'error',
+                'message': 'from must be before to'
+            }), 400
+        
+        task = export_all_reservations.delay(start.isoformat(), end.isoformat())
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Reservation export submitted. Poll the export status for progress.',
+            'task_id': task.id
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Failed to submit export request: {str(e)}'
+        }), 500
+
+
+@admin_bp.route('/export-status/<task_id>', methods=['GET'])
+@admin_required
+def check_reservation_export_status(task_id):
+    """Progress of a reservation export: chunks finished so far, then the manifest"""
+    try:
+        from celery.result import AsyncResult, GroupResult
+        from app import celery
+        
+        task_result = AsyncResult(task_id, app=celery)
+        response = {
+            'task_id': task_id,
+            'state': task_result.state,
+            'ready': False,
+        }
+        
+        if task_result.ready():
+            if not task_result.successful():
+                response['ready'] = True
+                response['error'] = str(task_result.info)
+                return jsonify(response), 200
+            
+            info = task_result.result
+            if info.get('status') != 'running':
+                response['ready'] = True
+                response['result'] = info
+                return jsonify(response), 200
+            
+            finalize = AsyncResult(info['finalize_id'], app=celery)
+            chunks = GroupResult.restore(info['group_id'], app=celery) if info['group_id'] else None
+            response['export_id'] = info['export_id']
+            response['progress'] = {
+                'chunks_done': chunks.completed_count() if chunks else (info['chunks'] if finalize.ready() else 0),
+                'chunks_total': info['chunks']
+            }
+            
+            if finalize.ready():
+                response['ready'] = True
+                if finalize.successful():
+                    response['result'] = finalize.result
+                else:
+                    response['error'] = str(finalize.info)
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Failed to check status: {str(e)}'
+        }), 500
+
+
+@admin_bp.route('/exports/<export_id>/<filename>', methods=['GET'])
+@admin_required
+def download_reservation_export(export_id, filename):
+    """Download the merged file, a part file or the manifest of a reservation export"""
+    export_dir = os.path.join(current_app.config['EXPORT_DIR'], f'reservations_{export_id}')
+    return send_from_directory(export_dir, filename, as_attachment=True)
+
 # ============= USER BLUEPRINT =============
 user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 
@@ -435,15 +930,33 @@ user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 @login_required
 def user_dashboard():
     try:
-        active_reservations = Reservation.query.filter_by(
-            user_id=current_user.id,
-            status='active'
+        # Plain rows with the duration computed in SQL (one clock reading), no ORM objects or lazy loads
+        now = datetime.utcnow()
+        reservation_rows = db.select(
+            Reservation.id, ParkingLot.prime_location_name, ParkingSpot.spot_number,
+            Reservation.vehicle_number, Reservation.parking_timestamp, Reservation.leaving_timestamp,
+            Reservation.parking_cost, ParkingLot.id.label('lot_id'), ParkingLot.price, ParkingLot.pricing_rules,
+            reservation_hours_expr(now).label('duration_hours')
+        ).join(
+            ParkingSpot, ParkingSpot.id == Reservation.spot_id
+        ).join(
+            ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+        ).where(Reservation.user_id == current_user.id)
+        
+        active_reservations = db.session.execute(
+            reservation_rows.where(Reservation.status == 'active')
         ).all()
         
-        completed_reservations = Reservation.query.filter_by(
-            user_id=current_user.id,
-            status='completed'
-        ).order_by(Reservation.leaving_timestamp.desc()).limit(10).all()
+        # Pick the last ten ids first, so only those rows are joined and costed rather than the whole history
+        recent_ids = db.select(Reservation.id).where(
+            Reservation.user_id == current_user.id,
+            Reservation.status == 'completed'
+        ).order_by(Reservation.leaving_timestamp.desc()).limit(10).scalar_subquery()
+        completed_reservations = db.session.execute(
+            reservation_rows.where(
+                Reservation.id.in_(recent_ids)
+            ).order_by(Reservation.leaving_timestamp.desc())
+        ).all()
         
         total_spent = db.session.query(func.sum(Reservation.parking_cost)).filter(
             Reservation.user_id == current_user.id,
@@ -454,23 +967,24 @@ def user_dashboard():
         for res in active_reservations:
             active_data.append({
                 'id': res.id,
-                'parking_lot': res.parking_spot.parking_lot.prime_location_name,
-                'spot_number': res.parking_spot.spot_number,
+                'parking_lot': res.prime_location_name,
+                'spot_number': res.spot_number,
                 'vehicle_number': res.vehicle_number,
                 'parked_since': res.parking_timestamp.isoformat(),
-                'duration_hours': res.get_duration_hours(),
-                'current_cost': round(res.get_duration_hours() * res.parking_spot.parking_lot.price, 2)
+                'duration_hours': round(res.duration_hours, 2),
+                # What releasing now would charge, under the lot's pricing rules
+                'current_cost': quote(res.lot_id, res.price, res.pricing_rules, res.parking_timestamp, now)
             })
         
         history_data = []
         for res in completed_reservations:
             history_data.append({
                 'id': res.id,
-                'parking_lot': res.parking_spot.parking_lot.prime_location_name,
-                'spot_number': res.parking_spot.spot_number,
+                'parking_lot': res.prime_location_name,
+                'spot_number': res.spot_number,
                 'parked_at': res.parking_timestamp.isoformat(),
                 'left_at': res.leaving_timestamp.isoformat() if res.leaving_timestamp else None,
-                'duration_hours': res.get_duration_hours(),
+                'duration_hours': round(res.duration_hours, 2),
                 'cost': res.parking_cost
             })
         
@@ -499,15 +1013,17 @@ def user_dashboard():
 
 @user_bp.route('/parking-lots/available', methods=['GET'])
 @login_required
+@cached_response('available_lots', ('lots',))
 def get_available_parking_lots():
     try:
-        lots = ParkingLot.query.all()
+        # Only show lots with available spots
+        lots = ParkingLot.query.filter(ParkingLot.available_count > 0).all()
         
         available_lots = []
         for lot in lots:
             available_spots = lot.get_available_spots_count()
             
-            if available_spots > 0:  # Only show lots with available spots
+            if available_spots > 0:
                 available_lots.append({
                     'id': lot.id,
                     'name': lot.prime_location_name,
@@ -517,7 +1033,8 @@ def get_available_parking_lots():
                     'pin_code': lot.pin_code,
                     'available_spots': available_spots,
                     'total_spots': lot.number_of_spots,
-                    'description': lot.description
+                    'description': lot.description,
+                    'pricing_rules': json.loads(lot.pricing_rules) if lot.pricing_rules else None
                 })
         
         response_data = {
@@ -533,8 +1050,22 @@ def get_available_parking_lots():
             'message': f'Failed to fetch parking lots: {str(e)}'
         }), 500
 
+@user_bp.route('/availability/stream', methods=['GET'])
+@login_required
+def stream_availability():
+    """Server-Sent Events: an 'availability' event with the lot's new counts on every booking or release"""
+    subscriber = availability_broker.subscribe()
+    # The stream stays open for as long as the page does; don't hold a pooled DB connection meanwhile
+    db.session.close()
+    return Response(
+        sse_stream(availability_broker, subscriber),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @user_bp.route('/book-spot', methods=['POST'])
 @login_required
+@retry_on_locked()
 def book_parking_spot():
     try:
         data = request.get_json()
@@ -555,17 +1086,6 @@ def book_parking_spot():
                 'message': 'Parking lot not found'
             }), 404
         
-        available_spot = ParkingSpot.query.filter_by(
-            lot_id=lot_id,
-            status='A'
-        ).first()
-        
-        if not available_spot:
-            return jsonify({
-                'status': 'error',
-                'message': 'No available spots in this parking lot'
-            }), 400
-        
         existing_reservation = Reservation.query.filter_by(
             user_id=current_user.id,
             status='active'
@@ -581,7 +1101,14 @@ def book_parking_spot():
                 }
             }), 400
         
-        available_spot.mark_occupied()
+        # Atomically claims the spot (status and lot counters) in this transaction
+        available_spot = spot_allocator.claim(lot.id)
+        
+        if not available_spot:
+            return jsonify({
+                'status': 'error',
+                'message': 'No available spots in this parking lot'
+            }), 400
         
         new_reservation = Reservation(
             spot_id=available_spot.id,
@@ -592,6 +1119,8 @@ def book_parking_spot():
         
         db.session.add(new_reservation)
         db.session.commit()
+        invalidate_cache('lots', 'dashboard', 'charts')
+        publish_availability(lot.id, 'booked')
         
         return jsonify({
             'status': 'success',
@@ -608,6 +1137,8 @@ def book_parking_spot():
         
     except Exception as e:
         db.session.rollback()
+        if is_database_locked(e):
+            raise  # Retried by @retry_on_locked
         return jsonify({
             'status': 'error',
             'message': f'Failed to book parking spot: {str(e)}'
@@ -615,9 +1146,11 @@ def book_parking_spot():
 
 @user_bp.route('/release-spot/<int:reservation_id>', methods=['POST'])
 @login_required
+@retry_on_locked()
 def release_parking_spot(reservation_id):
     try:
-        reservation = Reservation.query.get(reservation_id)
+        # Lock the row so two concurrent releases can't both complete it (no-op on SQLite)
+        reservation = Reservation.query.filter_by(id=reservation_id).with_for_update().first()
         
         if not reservation:
             return jsonify({
@@ -637,8 +1170,16 @@ def release_parking_spot(reservation_id):
                 'message': 'Reservation is not active'
             }), 400
         
-        reservation.complete_reservation()
+        if not reservation.complete_reservation():
+            db.session.rollback()
+            return jsonify({
+                'status': 'error',
+                'message': 'Reservation already released'
+            }), 400
         db.session.commit()
+        spot_allocator.release(reservation.parking_spot)
+        invalidate_cache('lots', 'dashboard', 'charts')
+        publish_availability(reservation.parking_spot.lot_id, 'released')
         
         return jsonify({
             'status': 'success',
@@ -658,6 +1199,8 @@ def release_parking_spot(reservation_id):
         
     except Exception as e:
         db.session.rollback()
+        if is_database_locked(e):
+            raise  # Retried by @retry_on_locked
         return jsonify({
             'status': 'error',
             'message': f'Failed to release parking spot: {str(e)}'
@@ -667,44 +1210,44 @@ def release_parking_spot(reservation_id):
 @login_required
 def get_user_charts():
     try:
-        reservations = Reservation.query.filter_by(
-            user_id=current_user.id,
-            status='completed'
-        ).all()
-        
-        total_hours = sum(res.get_duration_hours() for res in reservations)
-        total_cost = sum(res.parking_cost or 0 for res in reservations)
-        
-        lot_usage = {}
-        for res in reservations:
-            lot_name = res.parking_spot.parking_lot.prime_location_name
-            if lot_name not in lot_usage:
-                lot_usage[lot_name] = {
-                    'visits': 0,
-                    'total_hours': 0,
-                    'total_cost': 0
-                }
-            lot_usage[lot_name]['visits'] += 1
-            lot_usage[lot_name]['total_hours'] += res.get_duration_hours()
-            lot_usage[lot_name]['total_cost'] += res.parking_cost or 0
+        total_parkings, total_hours, total_cost = db.session.query(
+            func.coalesce(func.sum(UserMonthlyStat.reservations), 0),
+            func.coalesce(func.sum(UserMonthlyStat.hours), 0),
+            func.coalesce(func.sum(UserMonthlyStat.revenue), 0)
+        ).filter(UserMonthlyStat.user_id == current_user.id).one()
+        
+        # Visits, hours and spend per lot, aggregated by the database in one grouped query
+        lot_usage = db.session.query(
+            ParkingLot.prime_location_name,
+            func.count(Reservation.id),
+            func.coalesce(func.sum(reservation_hours_expr()), 0),
+            func.coalesce(func.sum(Reservation.parking_cost), 0)
+        ).join(
+            ParkingSpot, ParkingSpot.id == Reservation.spot_id
+        ).join(
+            ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+        ).filter(
+            Reservation.user_id == current_user.id,
+            Reservation.status == 'completed'
+        ).group_by(ParkingLot.prime_location_name).all()
         
         chart_data = []
-        for lot_name, stats in lot_usage.items():
+        for lot_name, visits, hours, cost in lot_usage:
             chart_data.append({
                 'parking_lot': lot_name,
-                'visits': stats['visits'],
-                'total_hours': round(stats['total_hours'], 2),
-                'total_cost': round(stats['total_cost'], 2)
+                'visits': visits,
+                'total_hours': round(hours, 2),
+                'total_cost': round(cost, 2)
             })
         
         return jsonify({
             'status': 'success',
             'charts': {
                 'summary': {
-                    'total_parkings': len(reservations),
+                    'total_parkings': total_parkings,
                     'total_hours': round(total_hours, 2),
                     'total_spent': round(total_cost, 2),
-                    'average_cost_per_visit': round(total_cost / len(reservations), 2) if reservations else 0
+                    'average_cost_per_visit': round(total_cost / total_parkings, 2) if total_parkings else 0
                 },
                 'by_parking_lot': chart_data
             }
@@ -739,6 +1282,40 @@ def export_parking_history():
         }), 500
 
 
+@user_bp.route('/export-history.csv', methods=['GET'])
+@login_required
+def download_parking_history():
+    """Stream the user's history as CSV; large histories go through the emailed export instead"""
+    user_id = current_user.id
+    total = db.session.query(func.count(Reservation.id)).filter(Reservation.user_id == user_id).scalar()
+    max_rows = current_app.config['EXPORT_SYNC_MAX_ROWS']
+    
+    if total > max_rows:
+        return jsonify({
+            'status': 'error',
+            'message': f'History has {total} reservations; exports over {max_rows} are emailed. Use POST /api/user/export-history.'
+        }), 413
+    
+    filename = f"parking_history_{datetime.utcnow():%Y-%m-%d}.csv"
+    return Response(
+        stream_with_context(iter_history_csv(user_id)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@user_bp.route('/exports/<filename>', methods=['GET'])
+@login_required
+def download_export_file(filename):
+    """Download a file written by the export job (linked from the email when too large to attach)"""
+    if not is_user_export(filename, current_user.id):
+        return jsonify({
+            'status': 'error',
+            'message': 'Export not found'
+        }), 404
+    return send_from_directory(current_app.config['EXPORT_DIR'], filename, as_attachment=True)
+
+
 @user_bp.route('/export-status/<task_id>', methods=['GET'])
 @login_required
 def check_export_status(task_id):
@@ -0,0 +1,211 @@
+"""Streaming CSV exports of reservations"""
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from sqlalchemy import func
+from models import db, User, ParkingLot, ParkingSpot, Reservation, reservation_hours_expr
+
+HISTORY_CSV_HEADER = [
+    'Reservation ID', 'Parking Lot', 'Spot Number', 'Vehicle Number',
+    'Parked At', 'Left At', 'Duration (hrs)', 'Cost', 'Status'
+]
+
+RESERVATION_CSV_HEADER = [
+    'Reservation ID', 'User ID', 'Username', 'Parking Lot ID', 'Parking Lot', 'Spot Number',
+    'Vehicle Number', 'Parked At', 'Left At', 'Duration (hrs)', 'Cost', 'Status'
+]
+
+EXPORT_BATCH_SIZE = 1000
+
+# Reservation ids per part file of the admin export
+EXPORT_CHUNK_SIZE = 250000
+
+
+def purge_expired_exports(export_dir, max_age_days):
+    """Delete export files and reservation export directories older than max_age_days; returns how many"""
+    if not os.path.isdir(export_dir):
+        return 0
+    cutoff = time.time() - max_age_days * 24 * 3600
+    removed = 0
+    for entry in os.scandir(export_dir):
+        if entry.stat().st_mtime >= cutoff:
+            continue
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            os.remove(entry.path)
+        removed += 1
+    return removed
+
+
+def export_filename(user_id, compress=False):
+    suffix = '.csv.gz' if compress else '.csv'
+    return f'parking_history_{user_id}_{datetime.utcnow():%Y%m%d%H%M%S}{suffix}'
+
+
+def is_user_export(filename, user_id):
+    """True if filename is one of export_filename()'s names for this user"""
+    return filename.startswith(f'parking_history_{user_id}_') and filename.endswith(('.csv', '.csv.gz'))
+
+
+def history_csv_row(row):
+    return [
+        row.id,
+        row.prime_location_name,
+        row.spot_number,
+        row.vehicle_number,
+        row.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        row.leaving_timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.leaving_timestamp else 'Active',
+        f"{row.duration_hours:.2f}",
+        f"{row.parking_cost or 0:.2f}",
+        row.status
+    ]
+
+
+def iter_history_rows(user_id, batch_size=EXPORT_BATCH_SIZE):
+    """CSV rows for the user's reservations, newest first, fetched batch_size at a time"""
+    query = db.select(
+        Reservation.id, ParkingLot.prime_location_name, ParkingSpot.spot_number, Reservation.vehicle_number,
+        Reservation.parking_timestamp, Reservation.leaving_timestamp,
+        reservation_hours_expr().label('duration_hours'), Reservation.parking_cost, Reservation.status
+    ).join(
+        ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).join(
+        ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+    ).where(
+        Reservation.user_id == user_id
+    ).order_by(
+        Reservation.created_at.desc()
+    ).execution_options(yield_per=batch_size)
+
+    for row in db.session.execute(query):
+        yield history_csv_row(row)
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return value
+
+
+def iter_history_csv(user_id, batch_size=EXPORT_BATCH_SIZE):
+    """The export as CSV text chunks of up to batch_size rows, for a streaming response"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HISTORY_CSV_HEADER)
+
+    for count, row in enumerate(iter_history_rows(user_id, batch_size), 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def write_history_csv(user_id, path, compress=False, batch_size=EXPORT_BATCH_SIZE):
+    """Write the export to path (gzip-compressed if asked); returns the number of rows written"""
+    opener = gzip.open if compress else open
+    count = 0
+    with opener(path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HISTORY_CSV_HEADER)
+        for row in iter_history_rows(user_id, batch_size):
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+# ============= ADMIN RESERVATION EXPORT =============
+
+def plan_reservation_chunks(start, end, chunk_size=EXPORT_CHUNK_SIZE):
+    """Split the reservations parked in [start, end) into (id_from, id_to) ranges of chunk_size ids"""
+    low, high = db.session.query(
+        func.min(Reservation.id), func.max(Reservation.id)
+    ).filter(
+        Reservation.parking_timestamp >= start,
+        Reservation.parking_timestamp < end
+    ).one()
+    if low is None:
+        return []
+    return [(id_from, min(id_from + chunk_size - 1, high)) for id_from in range(low, high + 1, chunk_size)]
+
+
+def reservation_csv_row(row):
+    return [
+        row.id,
+        row.user_id,
+        row.username,
+        row.lot_id,
+        row.prime_location_name,
+        row.spot_number,
+        row.vehicle_number,
+        row.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        row.leaving_timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.leaving_timestamp else 'Active',
+        f"{row.duration_hours:.2f}",
+        f"{row.parking_cost or 0:.2f}",
+        row.status
+    ]
+
+
+def write_reservation_part(path, start, end, id_from, id_to, batch_size=EXPORT_BATCH_SIZE):
+    """Write one id chunk of the admin export as a headerless gzip CSV; returns the number of rows"""
+    query = db.select(
+        Reservation.id, Reservation.user_id, User.username, ParkingSpot.lot_id,
+        ParkingLot.prime_location_name, ParkingSpot.spot_number, Reservation.vehicle_number,
+        Reservation.parking_timestamp, Reservation.leaving_timestamp,
+        reservation_hours_expr().label('duration_hours'), Reservation.parking_cost, Reservation.status
+    ).join(
+        User, User.id == Reservation.user_id
+    ).join(
+        ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).join(
+        ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+    ).where(
+        Reservation.id.between(id_from, id_to),
+        Reservation.parking_timestamp >= start,
+        Reservation.parking_timestamp < end
+    ).order_by(Reservation.id).execution_options(yield_per=batch_size)
+
+    count = 0
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for row in db.session.execute(query):
+            writer.writerow(reservation_csv_row(row))
+            count += 1
+    return count
+
+
+def finalize_reservation_export(export_dir, parts, start, end, merge=True):
+    """
+    Write manifest.json for the finished parts (listed in id order) and, if asked, a merged
+    reservations.csv.gz. Gzip members concatenate into a valid gzip file, so merging copies
+    the compressed parts byte for byte behind a header member without recompressing.
+    """
+    manifest = {
+        'from': start,
+        'to': end,
+        'columns': RESERVATION_CSV_HEADER,
+        'rows': sum(part['rows'] for part in parts),
+        'parts': parts,
+        'merged': None,
+        'finished_at': datetime.utcnow().isoformat()
+    }
+
+    if merge:
+        merged_path = os.path.join(export_dir, 'reservations.csv.gz')
+        with open(merged_path, 'wb') as merged:
+            with gzip.GzipFile(fileobj=merged, mode='wb') as header:
+                header.write((','.join(RESERVATION_CSV_HEADER) + '\r\n').encode('utf-8'))
+            for part in parts:
+                with open(os.path.join(export_dir, part['file']), 'rb') as f:
+                    shutil.copyfileobj(f, merged)
+        manifest['merged'] = 'reservations.csv.gz'
+
+    with open(os.path.join(export_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
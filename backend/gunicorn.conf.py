@@ -0,0 +1,43 @@
+"""Gunicorn settings for production serving"""
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# gevent only pays off on PostgreSQL (psycogreen makes queries yield). sqlite3 calls, and the
+# busy_timeout wait for SQLite's write lock, block the gevent hub and with it every request
+# on the worker, so SQLite deployments get OS threads instead.
+USES_POSTGRESQL = os.environ.get('DATABASE_URL', '').startswith('postgresql')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent' if USES_POSTGRESQL else 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# gthread only: threads per worker. Each open availability stream holds one
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    if server.cfg.worker_class_str == 'gevent' and not USES_POSTGRESQL:
+        raise RuntimeError(
+            'gevent workers need DATABASE_URL to point at PostgreSQL: SQLite calls block the gevent hub. '
+            'Use GUNICORN_WORKER_CLASS=gthread with SQLite.'
+        )
+
+
+def post_fork(server, worker):
+    if server.cfg.worker_class_str == 'gevent':
+        # psycopg2 blocks the whole worker on queries unless it yields to gevent
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            pass
@@ -0,0 +1,94 @@
+"""Run-once guard for scheduled Celery jobs"""
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from models import db, JobRun
+
+# Compare-and-delete, so a lock is only released by the holder that set it
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+@contextmanager
+def redis_lock(client, name, ttl):
+    """Yields True if the lock was acquired (always True without Redis: the ledger still guards)"""
+    if client is None:
+        yield True
+        return
+
+    key = f'lock:{name}'
+    token = uuid.uuid4().hex
+    acquired = bool(client.set(key, token, nx=True, ex=ttl))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            client.eval(_RELEASE_LOCK, 1, key, token)
+
+
+def _claim_run(job, period, stale_after):
+    """Insert (or take over) the ledger row for this period; None if it is done or in progress"""
+    run = JobRun(job=job, period=period, status='running')
+    db.session.add(run)
+    try:
+        db.session.commit()
+        return run
+    except IntegrityError:
+        db.session.rollback()
+
+    run = JobRun.query.filter_by(job=job, period=period).first()
+    if run.status == 'completed':
+        return None
+    if run.status in ('running', 'dispatched') and run.started_at > datetime.utcnow() - stale_after:
+        return None
+
+    # Failed, or in progress for longer than the lock lives (the worker or callback died): run it again
+    run.status = 'running'
+    run.started_at = datetime.utcnow()
+    run.finished_at = None
+    run.detail = None
+    db.session.commit()
+    return run
+
+
+@contextmanager
+def exclusive_run(job, period, lock_client=None, lock_ttl=3600):
+    """
+    Yields the JobRun to work under, or None if the period was already processed or another
+    instance is running it. The run is marked completed on exit (unless the body set it to
+    'dispatched'), or failed if the body raises; set run.detail to record a summary.
+    """
+    with redis_lock(lock_client, f'job:{job}', lock_ttl) as acquired:
+        run = _claim_run(job, period, timedelta(seconds=lock_ttl)) if acquired else None
+        if run is None:
+            yield None
+            return
+
+        try:
+            yield run
+        except Exception as e:
+            db.session.rollback()
+            run.status = 'failed'
+            run.detail = str(e)[:255]
+            run.finished_at = datetime.utcnow()
+            db.session.commit()
+            raise
+
+        if run.status != 'dispatched':
+            run.status = 'completed'
+            run.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def finish_run(run_id, status, detail=None):
+    """Record the outcome of a dispatched run ('completed' or 'failed')"""
+    run = db.session.get(JobRun, run_id)
+    run.status = status
+    run.detail = detail[:255] if detail else run.detail
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
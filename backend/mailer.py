@@ -0,0 +1,103 @@
+"""SMTP delivery with one persistent connection per worker process"""
+import logging
+import os
+import smtplib
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Reconnect after this many messages, so one session never lives forever
+MAX_MESSAGES_PER_CONNECTION = 1000
+
+
+def is_transient(error):
+    """Dropped sessions and 4xx replies may succeed on retry; 5xx replies won't"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError))
+
+
+class SMTPMailer:
+    def __init__(self, host='localhost', port=1025, sender='parking-system@localhost',
+                 max_retries=3, retry_delay=0.5, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self._smtp = None
+        self._sent_on_connection = 0
+        # One SMTP session can't interleave messages; threads of a worker take turns on it
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._smtp is None or self._sent_on_connection >= MAX_MESSAGES_PER_CONNECTION:
+            self._close()
+            self._smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            self._sent_on_connection = 0
+        return self._smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _send_one(self, msg):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._connection().send_message(msg)
+                self._sent_on_connection += 1
+                return True
+            except (smtplib.SMTPException, OSError) as e:
+                if not is_transient(e):
+                    # Rejected sender, recipient or message; a retry won't change that
+                    logger.warning("Email to %s rejected: %s", msg['To'], e)
+                    return False
+                # Dropped session or temporary failure: reconnect and try again
+                self._close()
+                if attempt == self.max_retries:
+                    logger.warning("Email to %s failed after %d attempts: %s", msg['To'], attempt + 1, e)
+                    return False
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+    def send(self, msg):
+        """Send one message over the shared connection; True if delivered"""
+        with self._lock:
+            return self._send_one(msg)
+
+    def send_batch(self, messages, label='batch'):
+        """Send messages over the shared connection; returns the number delivered"""
+        started = time.perf_counter()
+        sent = sum(1 for msg in messages if self.send(msg))
+        elapsed = time.perf_counter() - started
+        rate = sent / elapsed if elapsed > 0 else 0
+        logger.info("%s: sent %d/%d in %.2fs (%.0f msg/s)", label, sent, len(messages), elapsed, rate)
+        return sent
+
+
+_mailer = None
+_mailer_pid = None
+
+
+def get_mailer():
+    """The SMTPMailer of this process (a forked worker gets its own, never its parent's socket)"""
+    global _mailer, _mailer_pid
+    if _mailer is None or _mailer_pid != os.getpid():
+        _mailer = SMTPMailer(
+            host=os.environ.get('SMTP_HOST', 'localhost'),
+            port=int(os.environ.get('SMTP_PORT', 1025)),
+            sender=os.environ.get('SMTP_SENDER', 'parking-system@localhost')
+        )
+        _mailer_pid = os.getpid()
+    return _mailer
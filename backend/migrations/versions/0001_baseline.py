@@ -0,0 +1,78 @@
+"""Baseline schema (what db.create_all() produced before migrations)
+
+Revision ID: 0001_baseline
+Revises: 
+Create Date: 2026-10-17 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=255), nullable=False),
+        sa.Column('phone_number', sa.String(length=15), nullable=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table('parking_lots',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('prime_location_name', sa.String(length=200), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('address', sa.String(length=500), nullable=False),
+        sa.Column('pin_code', sa.String(length=10), nullable=False),
+        sa.Column('number_of_spots', sa.Integer(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('parking_spots',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('lot_id', sa.Integer(), nullable=False),
+        sa.Column('spot_number', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=1), nullable=False),
+        sa.Column('vehicle_type', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['lot_id'], ['parking_lots.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('lot_id', 'spot_number', name='unique_spot_per_lot')
+    )
+    op.create_table('reservations',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('spot_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('vehicle_number', sa.String(length=20), nullable=True),
+        sa.Column('parking_timestamp', sa.DateTime(), nullable=False),
+        sa.Column('leaving_timestamp', sa.DateTime(), nullable=True),
+        sa.Column('parking_cost', sa.Float(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['spot_id'], ['parking_spots.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('reservations')
+    op.drop_table('parking_spots')
+    op.drop_table('parking_lots')
+    op.drop_table('users')
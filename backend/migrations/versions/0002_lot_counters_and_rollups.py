@@ -0,0 +1,70 @@
+"""Lot availability counters, spot allocation index and reporting rollups
+
+Revision ID: 0002_lot_counters_and_rollups
+Revises: 0001_baseline
+Create Date: 2026-10-17 09:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_lot_counters_and_rollups'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() may already have some of these
+    inspector = sa.inspect(op.get_bind())
+    lot_columns = {col['name'] for col in inspector.get_columns('parking_lots')}
+    spot_indexes = {index['name'] for index in inspector.get_indexes('parking_spots')}
+    tables = set(inspector.get_table_names())
+
+    if 'available_count' not in lot_columns:
+        with op.batch_alter_table('parking_lots') as batch_op:
+            batch_op.add_column(sa.Column('available_count', sa.Integer(), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('occupied_count', sa.Integer(), nullable=False, server_default='0'))
+        op.execute("""
+            UPDATE parking_lots SET
+                available_count = (SELECT COUNT(*) FROM parking_spots
+                                   WHERE parking_spots.lot_id = parking_lots.id AND parking_spots.status = 'A'),
+                occupied_count = (SELECT COUNT(*) FROM parking_spots
+                                  WHERE parking_spots.lot_id = parking_lots.id AND parking_spots.status = 'O')
+        """)
+
+    if 'ix_parking_spots_lot_status' not in spot_indexes:
+        op.create_index('ix_parking_spots_lot_status', 'parking_spots', ['lot_id', 'status'])
+
+    # Rollups start empty; the app backfills them from history on startup (flask backfill-rollups)
+    if 'lot_daily_stats' not in tables:
+        op.create_table('lot_daily_stats',
+            sa.Column('lot_id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('reservations', sa.Integer(), nullable=False),
+            sa.Column('hours', sa.Float(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['lot_id'], ['parking_lots.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('lot_id', 'day')
+        )
+    if 'user_monthly_stats' not in tables:
+        op.create_table('user_monthly_stats',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('month', sa.Date(), nullable=False),
+            sa.Column('reservations', sa.Integer(), nullable=False),
+            sa.Column('hours', sa.Float(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('user_id', 'month')
+        )
+
+
+def downgrade():
+    op.drop_table('user_monthly_stats')
+    op.drop_table('lot_daily_stats')
+    op.drop_index('ix_parking_spots_lot_status', table_name='parking_spots')
+    with op.batch_alter_table('parking_lots') as batch_op:
+        batch_op.drop_column('occupied_count')
+        batch_op.drop_column('available_count')
@@ -0,0 +1,47 @@
+"""Indexes for the hot reservation and user predicates
+
+Revision ID: 0003_hot_query_indexes
+Revises: 0002_lot_counters_and_rollups
+Create Date: 2026-10-17 09:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_query_indexes'
+down_revision = '0002_lot_counters_and_rollups'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_users_is_admin_is_active', 'users', ['is_admin', 'is_active'], {}),
+    ('ix_reservations_user_status', 'reservations', ['user_id', 'status'], {}),
+    ('ix_reservations_user_created', 'reservations', ['user_id', 'created_at'], {}),
+    ('ix_reservations_created_at', 'reservations', ['created_at'], {}),
+    ('ix_reservations_status_parked', 'reservations', ['status', 'parking_timestamp'], {}),
+    # Partial index: only active reservations (SQLite and PostgreSQL; a plain index elsewhere)
+    ('ix_reservations_active_spot', 'reservations', ['spot_id'], {
+        'sqlite_where': sa.text("status = 'active'"),
+        'postgresql_where': sa.text("status = 'active'")
+    }),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = {
+        index['name']
+        for table in ('users', 'reservations')
+        for index in inspector.get_indexes(table)
+    }
+    for name, table, columns, kwargs in INDEXES:
+        if name not in existing:
+            op.create_index(name, table, columns, **kwargs)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,35 @@
+"""Ledger of scheduled job runs
+
+Revision ID: 0004_job_runs
+Revises: 0003_hot_query_indexes
+Create Date: 2026-10-17 14:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_job_runs'
+down_revision = '0003_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job', sa.String(length=100), nullable=False),
+        sa.Column('period', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('detail', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job', 'period', name='unique_run_per_job_period')
+    )
+
+
+def downgrade():
+    op.drop_table('job_runs')
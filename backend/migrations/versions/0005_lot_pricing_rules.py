@@ -0,0 +1,26 @@
+"""Per-lot pricing rules
+
+Revision ID: 0005_lot_pricing_rules
+Revises: 0004_job_runs
+Create Date: 2026-10-17 19:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_lot_pricing_rules'
+down_revision = '0004_job_runs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('parking_lots') as batch_op:
+        batch_op.add_column(sa.Column('pricing_rules', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('parking_lots') as batch_op:
+        batch_op.drop_column('pricing_rules')
@@ -0,0 +1,26 @@
+"""Index for reservations parked in a time window
+
+Revision ID: 0006_reservation_parked_index
+Revises: 0005_lot_pricing_rules
+Create Date: 2026-10-17 21:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_reservation_parked_index'
+down_revision = '0005_lot_pricing_rules'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('reservations')}
+    if 'ix_reservations_parked_id' not in existing:
+        op.create_index('ix_reservations_parked_id', 'reservations', ['parking_timestamp', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_reservations_parked_id', table_name='reservations')
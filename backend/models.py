@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime, timezone
-from werkzeug.security import generate_password_hash, check_password_hash
+import passwords
+import pricing
+from sqlalchemy import func, case, extract, update
 
 db = SQLAlchemy()
 
@@ -19,11 +22,18 @@ class User(UserMixin, db.Model):
     
     reservations = db.relationship('Reservation', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    # Admin lookup and the active-user scans of the reminder/report jobs
+    __table_args__ = (db.Index('ix_users_is_admin_is_active', 'is_admin', 'is_active'),)
+    
+    # Hashing runs on the bounded pool in passwords.py; both may raise passwords.HashingBusy
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return passwords.password_hasher.needs_rehash(self.password_hash)
     
     def get_role(self):
         return 'admin' if self.is_admin else 'user'
@@ -40,17 +50,32 @@ class ParkingLot(db.Model):
     address = db.Column(db.String(500), nullable=False)
     pin_code = db.Column(db.String(10), nullable=False)
     number_of_spots = db.Column(db.Integer, nullable=False)
+    available_count = db.Column(db.Integer, default=0, nullable=False)  # Maintained on book/release
+    occupied_count = db.Column(db.Integer, default=0, nullable=False)
     description = db.Column(db.Text, nullable=True)
+    pricing_rules = db.Column(db.Text, nullable=True)  # JSON peak/weekend/cap rules, see pricing.py; NULL = flat price
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     parking_spots = db.relationship('ParkingSpot', backref='parking_lot', lazy=True, cascade='all, delete-orphan')
     
     def get_available_spots_count(self):
-        return sum(1 for spot in self.parking_spots if spot.status == 'A')
+        return self.available_count
     
     def get_occupied_spots_count(self):
-        return sum(1 for spot in self.parking_spots if spot.status == 'O')
+        return self.occupied_count
+    
+    @staticmethod
+    def shift_spot_counts(lot_id, available=0, occupied=0):
+        """Atomically adjust the counters in SQL so concurrent writers don't overwrite each other"""
+        db.session.execute(
+            db.update(ParkingLot)
+            .where(ParkingLot.id == lot_id)
+            .values(
+                available_count=ParkingLot.available_count + available,
+                occupied_count=ParkingLot.occupied_count + occupied
+            )
+        )
     
     def __repr__(self):
         return f'<ParkingLot {self.prime_location_name}>'
@@ -68,18 +93,42 @@ class ParkingSpot(db.Model):
     
     reservations = db.relationship('Reservation', backref='parking_spot', lazy=True, cascade='all, delete-orphan')
     
-    __table_args__ = (db.UniqueConstraint('lot_id', 'spot_number', name='unique_spot_per_lot'),)
+    __table_args__ = (
+        db.UniqueConstraint('lot_id', 'spot_number', name='unique_spot_per_lot'),
+        db.Index('ix_parking_spots_lot_status', 'lot_id', 'status'),
+    )
     
     def is_available(self):
         return self.status == 'A'
     
+    def _change_status(self, old, new):
+        """
+        Compare-and-set the spot from `old` to `new` in SQL; the lot counters only move when this
+        request's UPDATE changed the row, never on the strength of a stale in-memory status.
+        Returns False if the spot was not in `old` (e.g. another request got there first).
+        """
+        updated_at = datetime.now(timezone.utc)
+        result = db.session.execute(
+            db.update(ParkingSpot)
+            .where(ParkingSpot.id == self.id, ParkingSpot.status == old)
+            .values(status=new, updated_at=updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        set_committed_value(self, 'status', new)
+        set_committed_value(self, 'updated_at', updated_at)
+        if new == 'O':
+            ParkingLot.shift_spot_counts(self.lot_id, available=-1, occupied=1)
+        else:
+            ParkingLot.shift_spot_counts(self.lot_id, available=1, occupied=-1)
+        return True
+    
     def mark_occupied(self):
-        self.status = 'O'
-        self.updated_at = datetime.now(timezone.utc)
+        return self._change_status('A', 'O')
     
     def mark_available(self):
-        self.status = 'A'
-        self.updated_at = datetime.now(timezone.utc)
+        return self._change_status('O', 'A')
     
     def __repr__(self):
         return f'<ParkingSpot {self.spot_number} - Status: {self.status}>'
@@ -98,29 +147,280 @@ class Reservation(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
+    __table_args__ = (
+        # A user's active/completed reservations (booking check, dashboard, history)
+        db.Index('ix_reservations_user_status', 'user_id', 'status'),
+        # A user's latest reservations (reminders, exports)
+        db.Index('ix_reservations_user_created', 'user_id', 'created_at'),
+        # Recent activity feed
+        db.Index('ix_reservations_created_at', 'created_at'),
+        # Completed reservations in a time window (hourly charts)
+        db.Index('ix_reservations_status_parked', 'status', 'parking_timestamp'),
+        # Reservations parked in a time window, any status (admin export chunks)
+        db.Index('ix_reservations_parked_id', 'parking_timestamp', 'id'),
+        # Active reservation of a spot (lot details); partial so it only holds the few active rows
+        db.Index(
+            'ix_reservations_active_spot', 'spot_id',
+            sqlite_where=db.text("status = 'active'"),
+            postgresql_where=db.text("status = 'active'")
+        ),
+    )
+    
     def calculate_cost(self):
         if self.leaving_timestamp:
-            duration = (self.leaving_timestamp - self.parking_timestamp).total_seconds() / 3600
-            price_per_hour = self.parking_spot.parking_lot.price
-            self.parking_cost = round(max(duration, 1) * price_per_hour, 2)
+            self.parking_cost = pricing.quote_lot(
+                self.parking_spot.parking_lot, self.parking_timestamp, self.leaving_timestamp
+            )
         return self.parking_cost
     
     def complete_reservation(self):
-        self.leaving_timestamp = datetime.now(timezone.utc)
-        self.status = 'completed'
-        self.calculate_cost()
+        """Complete an active reservation; False if a concurrent release already completed it"""
+        # Naive UTC to match the column defaults; SQLite drops tzinfo on round trip
+        left_at = datetime.utcnow()
+        values = {
+            'status': 'completed',
+            'leaving_timestamp': left_at,
+            'parking_cost': pricing.quote_lot(self.parking_spot.parking_lot, self.parking_timestamp, left_at),
+            'updated_at': datetime.now(timezone.utc)
+        }
+        # Compare-and-set on the status: row locks don't exist on SQLite, so this is what stops
+        # two releases from both freeing the spot and counting the stay in the rollups
+        result = db.session.execute(
+            db.update(Reservation)
+            .where(Reservation.id == self.id, Reservation.status == 'active')
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        for key, value in values.items():
+            set_committed_value(self, key, value)
+        
         self.parking_spot.mark_available()
-        self.updated_at = datetime.now(timezone.utc)
+        record_reservation_rollups(
+            self.parking_spot.lot_id, self.user_id,
+            self.parking_timestamp, self.leaving_timestamp, self.parking_cost
+        )
+        return True
     
     def get_duration_hours(self):
         if self.leaving_timestamp:
             return round((self.leaving_timestamp - self.parking_timestamp).total_seconds() / 3600, 2)
         else:
-            return round((datetime.now(timezone.utc) - self.parking_timestamp).total_seconds() / 3600, 2)
+            return round((datetime.utcnow() - self.parking_timestamp).total_seconds() / 3600, 2)
     
     def __repr__(self):
         return f'<Reservation User:{self.user_id} Spot:{self.spot_id} Status:{self.status}>'
 
+class LotDailyStat(db.Model):
+    """Completed reservations rolled up per lot per day (day the parking started)"""
+    __tablename__ = 'lot_daily_stats'
+    
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    reservations = db.Column(db.Integer, default=0, nullable=False)
+    hours = db.Column(db.Float, default=0.0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    
+    def __repr__(self):
+        return f'<LotDailyStat Lot:{self.lot_id} {self.day}>'
+
+class UserMonthlyStat(db.Model):
+    """Completed reservations rolled up per user per month (first day of the month)"""
+    __tablename__ = 'user_monthly_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    reservations = db.Column(db.Integer, default=0, nullable=False)
+    hours = db.Column(db.Float, default=0.0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    
+    def __repr__(self):
+        return f'<UserMonthlyStat User:{self.user_id} {self.month}>'
+
+class JobRun(db.Model):
+    """Ledger of scheduled job runs: one row per job per period it has processed"""
+    __tablename__ = 'job_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(100), nullable=False)
+    period = db.Column(db.String(20), nullable=False)  # e.g. '2026-10-17' (daily) or '2026-09' (monthly)
+    status = db.Column(db.String(20), default='running', nullable=False)  # 'running', 'dispatched', 'completed', 'failed'
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    detail = db.Column(db.String(255))
+    
+    __table_args__ = (
+        db.UniqueConstraint('job', 'period', name='unique_run_per_job_period'),
+    )
+    
+    def __repr__(self):
+        return f'<JobRun {self.job} {self.period} {self.status}>'
+
+def duration_hours_expr(start, end):
+    """SQL expression for the hours between two timestamps, computed by the database"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return extract('epoch', end - start).cast(db.Float) / 3600
+    return (func.julianday(end) - func.julianday(start)) * 24
+
+def reservation_hours_expr(now=None):
+    """
+    SQL expression for Reservation.get_duration_hours() (unrounded): active reservations count
+    up to `now`, taken once for the whole query rather than per row
+    """
+    now = db.literal(now or datetime.utcnow(), db.DateTime)
+    return duration_hours_expr(Reservation.parking_timestamp, func.coalesce(Reservation.leaving_timestamp, now))
+
+def _upsert_rollup(model, key, hours, revenue, reservations=1):
+    """Add to a rollup row, creating it if needed, in a single atomic statement"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    
+    table = model.__table__
+    stmt = insert(table).values(**key, reservations=reservations, hours=hours, revenue=revenue)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={
+            'reservations': table.c.reservations + stmt.excluded.reservations,
+            'hours': table.c.hours + stmt.excluded.hours,
+            'revenue': table.c.revenue + stmt.excluded.revenue
+        }
+    )
+    db.session.execute(stmt)
+
+def record_reservation_rollups(lot_id, user_id, parked_at, left_at, cost):
+    """Fold one completed reservation into the daily lot and monthly user rollups"""
+    hours = (left_at - parked_at).total_seconds() / 3600
+    _upsert_rollup(LotDailyStat, {'lot_id': lot_id, 'day': parked_at.date()}, hours, cost or 0)
+    _upsert_rollup(UserMonthlyStat, {'user_id': user_id, 'month': parked_at.date().replace(day=1)}, hours, cost or 0)
+
+def compute_rollups_from_reservations(lot_id=None, batch_size=5000):
+    """Aggregate the raw reservations table (optionally one lot's) into the rollup shapes, streaming rows in batches"""
+    lot_days = {}
+    user_months = {}
+    rows = db.session.query(
+        ParkingSpot.lot_id,
+        Reservation.user_id,
+        Reservation.parking_timestamp,
+        Reservation.leaving_timestamp,
+        Reservation.parking_cost
+    ).join(
+        ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).filter(
+        Reservation.status == 'completed',
+        Reservation.leaving_timestamp.isnot(None)
+    )
+    if lot_id is not None:
+        rows = rows.filter(ParkingSpot.lot_id == lot_id)
+    
+    for row_lot_id, user_id, parked_at, left_at, cost in rows.yield_per(batch_size):
+        hours = (left_at - parked_at).total_seconds() / 3600
+        for totals, key in (
+            (lot_days, (row_lot_id, parked_at.date())),
+            (user_months, (user_id, parked_at.date().replace(day=1)))
+        ):
+            entry = totals.setdefault(key, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += hours
+            entry[2] += cost or 0
+    
+    return lot_days, user_months
+
+def remove_lot_rollups(lot_id):
+    """Take a lot's history out of the rollups before the lot (and its reservations) is deleted"""
+    _, user_months = compute_rollups_from_reservations(lot_id=lot_id)
+    for (user_id, month), (count, hours, revenue) in user_months.items():
+        _upsert_rollup(UserMonthlyStat, {'user_id': user_id, 'month': month}, -hours, -revenue, reservations=-count)
+    LotDailyStat.query.filter_by(lot_id=lot_id).delete()
+
+def backfill_rollups():
+    """Rebuild both rollup tables from the raw reservations history"""
+    lot_days, user_months = compute_rollups_from_reservations()
+    
+    db.session.query(LotDailyStat).delete()
+    db.session.query(UserMonthlyStat).delete()
+    if lot_days:
+        db.session.execute(LotDailyStat.__table__.insert(), [
+            {'lot_id': lot_id, 'day': day, 'reservations': count, 'hours': hours, 'revenue': revenue}
+            for (lot_id, day), (count, hours, revenue) in lot_days.items()
+        ])
+    if user_months:
+        db.session.execute(UserMonthlyStat.__table__.insert(), [
+            {'user_id': user_id, 'month': month, 'reservations': count, 'hours': hours, 'revenue': revenue}
+            for (user_id, month), (count, hours, revenue) in user_months.items()
+        ])
+    db.session.commit()
+    return len(lot_days), len(user_months)
+
+def reprice_reservations(lot_id=None, batch_size=5000):
+    """
+    Recompute parking_cost of completed reservations (optionally one lot's) under the current
+    pricing, in batches; returns (reservations checked, costs changed). Rollups are not touched:
+    rebuild them afterwards with backfill_rollups().
+    """
+    query = db.select(
+        Reservation.id, ParkingLot.id, ParkingLot.price, ParkingLot.pricing_rules,
+        Reservation.parking_timestamp, Reservation.leaving_timestamp, Reservation.parking_cost
+    ).join(
+        ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).join(
+        ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+    ).where(
+        Reservation.status == 'completed',
+        Reservation.leaving_timestamp.isnot(None)
+    ).order_by(Reservation.id)
+    if lot_id is not None:
+        query = query.where(ParkingSpot.lot_id == lot_id)
+    
+    checked = changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(query.where(Reservation.id > last_id).limit(batch_size)).all()
+        if not rows:
+            break
+        updates = []
+        for reservation_id, row_lot_id, price, rules, parked_at, left_at, old_cost in rows:
+            cost = pricing.quote(row_lot_id, price, rules, parked_at, left_at)
+            if cost != old_cost:
+                updates.append({'id': reservation_id, 'parking_cost': cost})
+        if updates:
+            db.session.execute(update(Reservation), updates)
+        db.session.commit()
+        checked += len(rows)
+        changed += len(updates)
+        last_id = rows[-1][0]
+    return checked, changed
+
+def check_rollups(tolerance=0.01):
+    """
+    Compare the rollup tables against the raw reservations table.
+    Returns a list of human-readable mismatches (empty when consistent).
+    """
+    lot_days, user_months = compute_rollups_from_reservations()
+    mismatches = []
+    
+    for model, expected, key_columns in (
+        (LotDailyStat, lot_days, ('lot_id', 'day')),
+        (UserMonthlyStat, user_months, ('user_id', 'month'))
+    ):
+        stored = {
+            tuple(getattr(row, column) for column in key_columns): [row.reservations, row.hours, row.revenue]
+            for row in model.query.all()
+        }
+        for key in set(expected) | set(stored):
+            want = expected.get(key, [0, 0.0, 0.0])
+            have = stored.get(key, [0, 0.0, 0.0])
+            if want[0] != have[0] or abs(want[1] - have[1]) > tolerance or abs(want[2] - have[2]) > tolerance:
+                mismatches.append(
+                    f'{model.__tablename__} {key}: stored {have[0]} res / {have[1]:.2f} h / {have[2]:.2f}, '
+                    f'raw {want[0]} res / {want[1]:.2f} h / {want[2]:.2f}'
+                )
+    
+    return mismatches
+
 def create_admin_user():
     admin = User.query.filter_by(is_admin=True).first()
     if not admin:
@@ -135,6 +435,90 @@ def create_admin_user():
         db.session.commit()
     return admin
 
+def section_label(index):
+    """Spreadsheet-style section letters: 0 -> A, 25 -> Z, 26 -> AA, ..."""
+    label = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(65 + remainder) + label
+    return label
+
+def generate_spot_numbers(num_spots, section_size=100):
+    """Yield spot numbers in order: A-01 ... A-100, B-01 ..."""
+    for position in range(num_spots):
+        section_idx, offset = divmod(position, section_size)
+        yield f"{section_label(section_idx)}-{offset + 1:02d}"
+
+def bulk_create_spots(lot_id, num_spots, chunk_size=5000):
+    """
+    Insert all spots of a new lot with executemany batches instead of ORM objects,
+    so memory stays bounded by chunk_size rather than the size of the lot.
+    """
+    now = datetime.utcnow()
+    chunk = []
+    for spot_number in generate_spot_numbers(num_spots):
+        chunk.append({
+            'lot_id': lot_id,
+            'spot_number': spot_number,
+            'status': 'A',
+            'vehicle_type': '4-wheeler',
+            'created_at': now,
+            'updated_at': now
+        })
+        if len(chunk) >= chunk_size:
+            db.session.execute(ParkingSpot.__table__.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(ParkingSpot.__table__.insert(), chunk)
+
+def bulk_delete_lot(lot_id):
+    """
+    Delete a lot with its spots and their reservations as three set-based DELETEs,
+    instead of the ORM cascade loading every spot and its reservations.
+    """
+    spot_ids = db.select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id)
+    for stmt in (
+        db.delete(Reservation).where(Reservation.spot_id.in_(spot_ids)),
+        db.delete(ParkingSpot).where(ParkingSpot.lot_id == lot_id),
+        db.delete(ParkingLot).where(ParkingLot.id == lot_id)
+    ):
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+
+def reconcile_spot_counts():
+    """
+    Recompute the per-lot availability counters from the spots table and repair any drift.
+    Returns a list of the lots that were corrected.
+    """
+    available = func.sum(case((ParkingSpot.status == 'A', 1), else_=0))
+    occupied = func.sum(case((ParkingSpot.status == 'O', 1), else_=0))
+    actual = {
+        lot_id: (int(avail or 0), int(occ or 0))
+        for lot_id, avail, occ in db.session.query(
+            ParkingSpot.lot_id, available, occupied
+        ).group_by(ParkingSpot.lot_id)
+    }
+    
+    repaired = []
+    for lot in ParkingLot.query.all():
+        avail, occ = actual.get(lot.id, (0, 0))
+        if lot.available_count != avail or lot.occupied_count != occ:
+            repaired.append({
+                'lot_id': lot.id,
+                'available': (lot.available_count, avail),
+                'occupied': (lot.occupied_count, occ)
+            })
+            lot.available_count = avail
+            lot.occupied_count = occ
+    
+    db.session.commit()
+    return repaired
+
+def backfill_rollups_if_empty():
+    """Populate the rollup tables on databases that already had history when they were added"""
+    if not LotDailyStat.query.first() and Reservation.query.filter_by(status='completed').first():
+        backfill_rollups()
+
 def init_db(app):
     with app.app_context():
         db.create_all()
@@ -0,0 +1,81 @@
+"""Password hashing off the request threads"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are already queued in this process"""
+
+
+def normalize_method(method):
+    """The method string Werkzeug stores in front of a hash made with `method`"""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        return f"scrypt:{':'.join(args) if args else '32768:8:1'}"
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f"Unsupported password hash method '{method}'")
+
+
+def _native_executor(workers):
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            # A patched ThreadPoolExecutor would hash on greenlets and block the whole worker
+            from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+            return NativeThreadPoolExecutor(max_workers=workers)
+    except ImportError:
+        pass
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_HASH_METHOD, workers=2, max_pending=64):
+        self.method = normalize_method(method)
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Threads don't survive fork: each worker process starts its own pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = _native_executor(self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if the hash was made with other parameters than the configured ones"""
+        return password_hash.split('$', 1)[0] != self.method
+
+
+# The process-wide hasher (replaced with the configured one at app initialization)
+password_hasher = PasswordHasher()
+
+
+def init_password_hasher(hasher_instance):
+    global password_hasher
+    password_hasher = hasher_instance
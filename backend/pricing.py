@@ -0,0 +1,184 @@
+"""Parking pricing engine"""
+import json
+import threading
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Stays are billed for at least this long
+MINIMUM_BILLED_HOURS = 1
+
+DAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+# A Monday 00:00, the origin of the minute-of-week numbering
+_WEEK_ORIGIN = datetime(1970, 1, 5)
+
+
+def _parse_time(value):
+    try:
+        hours, minutes = (int(part) for part in value.split(':'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid time '{value}', expected HH:MM")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time '{value}', expected HH:MM")
+    return hours * 60 + minutes
+
+
+def _parse_days(days):
+    if days is None:
+        return list(range(7))
+    if not isinstance(days, list):
+        raise ValueError('Window days must be a list')
+    parsed = []
+    for day in days:
+        if isinstance(day, str) and day.lower()[:3] in DAY_NAMES:
+            parsed.append(DAY_NAMES.index(day.lower()[:3]))
+        elif isinstance(day, int) and 0 <= day < 7:
+            parsed.append(day)
+        else:
+            raise ValueError(f"Invalid day '{day}', expected mon..sun or 0..6")
+    return parsed
+
+
+def _parse_price(value, name):
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if price < 0:
+        raise ValueError(f'{name} must not be negative')
+    return price
+
+
+class RateTable:
+    """A lot's compiled prices: per-minute rates over one week and their running totals"""
+
+    def __init__(self, minute_rates, utc_offset_minutes=0, daily_cap=None):
+        self.minute_rates = minute_rates
+        self.cumulative = [0.0, *accumulate(minute_rates)]
+        self.week_total = self.cumulative[-1]
+        self.offset = timedelta(minutes=utc_offset_minutes)
+        self.daily_cap = daily_cap
+
+    def _minutes(self, moment):
+        """Local minutes since the week origin for a naive UTC timestamp"""
+        return (moment + self.offset - _WEEK_ORIGIN).total_seconds() / 60
+
+    def _cost_to(self, minutes):
+        """Cost of parking from the week origin up to `minutes`"""
+        weeks, minute_of_week = divmod(minutes, MINUTES_PER_WEEK)
+        index = int(minute_of_week)
+        return (
+            weeks * self.week_total
+            + self.cumulative[index]
+            + (minute_of_week - index) * self.minute_rates[index]
+        )
+
+    def cost(self, start, end):
+        """Unrounded cost of parking from start to end (naive UTC timestamps)"""
+        start_minutes, end_minutes = self._minutes(start), self._minutes(end)
+        if end_minutes <= start_minutes:
+            return 0.0
+        if self.daily_cap is None:
+            return self._cost_to(end_minutes) - self._cost_to(start_minutes)
+
+        total = 0.0
+        day_start = start_minutes
+        while day_start < end_minutes:
+            day_end = min(end_minutes, (day_start // MINUTES_PER_DAY + 1) * MINUTES_PER_DAY)
+            total += min(self.daily_cap, self._cost_to(day_end) - self._cost_to(day_start))
+            day_start = day_end
+        return total
+
+
+def compile_rules(price, rules=None):
+    """RateTable for a lot's hourly price and pricing rules (dict); raises ValueError on bad rules"""
+    base = _parse_price(price, 'price') / 60
+    rules = rules or {}
+    if not isinstance(rules, dict):
+        raise ValueError('pricing_rules must be an object')
+    unknown = set(rules) - {'utc_offset_minutes', 'weekend_price', 'windows', 'daily_cap'}
+    if unknown:
+        raise ValueError(f"Unknown pricing rule(s): {', '.join(sorted(unknown))}")
+
+    minute_rates = [base] * MINUTES_PER_WEEK
+    if rules.get('weekend_price') is not None:
+        weekend = _parse_price(rules['weekend_price'], 'weekend_price') / 60
+        minute_rates[5 * MINUTES_PER_DAY:] = [weekend] * (2 * MINUTES_PER_DAY)
+
+    for window in rules.get('windows') or []:
+        if not isinstance(window, dict):
+            raise ValueError('Each pricing window must be an object')
+        rate = _parse_price(window.get('price'), 'window price') / 60
+        start, end = _parse_time(window.get('start')), _parse_time(window.get('end'))
+        # A window ending at or before its start runs past midnight into the next day
+        length = (end - start) % MINUTES_PER_DAY or MINUTES_PER_DAY
+        for day in _parse_days(window.get('days')):
+            first = day * MINUTES_PER_DAY + start
+            for minute in range(first, first + length):
+                minute_rates[minute % MINUTES_PER_WEEK] = rate
+
+    daily_cap = rules.get('daily_cap')
+    if daily_cap is not None:
+        daily_cap = _parse_price(daily_cap, 'daily_cap')
+    try:
+        utc_offset_minutes = int(rules.get('utc_offset_minutes', 0))
+    except (TypeError, ValueError):
+        raise ValueError('utc_offset_minutes must be an integer')
+
+    return RateTable(minute_rates, utc_offset_minutes, daily_cap)
+
+
+def parse_pricing_rules(value):
+    """
+    Validate pricing rules from an API request (a JSON object, or null/empty for flat pricing)
+    and return them as stored in ParkingLot.pricing_rules; raises ValueError if invalid
+    """
+    if value in (None, '', {}):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError('pricing_rules must be valid JSON')
+    compile_rules(0, value)
+    return json.dumps(value, sort_keys=True)
+
+
+# lot_id -> ((price, rules json), RateTable)
+_rate_tables = {}
+_rate_tables_lock = threading.Lock()
+
+
+def rate_table(lot_id, price, pricing_rules):
+    """The lot's compiled RateTable, compiled on first use and whenever its price or rules change"""
+    source = (price, pricing_rules)
+    with _rate_tables_lock:
+        cached = _rate_tables.get(lot_id)
+    if cached is not None and cached[0] == source:
+        return cached[1]
+
+    table = compile_rules(price, json.loads(pricing_rules) if pricing_rules else None)
+    with _rate_tables_lock:
+        _rate_tables[lot_id] = (source, table)
+    return table
+
+
+def invalidate_lot_pricing(lot_id):
+    with _rate_tables_lock:
+        _rate_tables.pop(lot_id, None)
+
+
+def quote(lot_id, price, pricing_rules, start, end):
+    """Charge for parking in a lot from start to end, rounded to 2 decimals"""
+    billed_end = max(end, start + timedelta(hours=MINIMUM_BILLED_HOURS))
+    if not pricing_rules:
+        # Flat hourly price: no table needed
+        return round((billed_end - start).total_seconds() / 3600 * price, 2)
+    return round(rate_table(lot_id, price, pricing_rules).cost(start, billed_end), 2)
+
+
+def quote_lot(lot, start, end):
+    return quote(lot.id, lot.price, lot.pricing_rules, start, end)
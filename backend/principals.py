@@ -0,0 +1,198 @@
+"""Cached user principal for authenticated requests"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, User
+
+# Columns whose change makes a cached snapshot stale
+PRINCIPAL_COLUMNS = ('password_hash', 'is_admin', 'is_active', 'username', 'email')
+# Columns whose change also revokes the user's bearer tokens, which carry them as claims
+TOKEN_COLUMNS = ('is_admin', 'is_active')
+
+
+class UserPrincipal:
+    """Read-only view of a user, usable as Flask-Login's current_user"""
+
+    __slots__ = ('id', 'username', 'email', 'is_admin', 'is_active')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, email, is_admin, is_active):
+        for name, value in zip(self.__slots__, (id, username, email, is_admin, is_active)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('UserPrincipal is read-only; load the User row to change it')
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email, user.is_admin, user.is_active)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def get_id(self):
+        return str(self.id)
+
+    def get_role(self):
+        return 'admin' if self.is_admin else 'user'
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.username} - Role: {self.get_role()}>'
+
+
+class PrincipalCache:
+    def __init__(self, redis_client=None, ttl=30, redis_ttl=300, max_size=10000, prefix='principal:'):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.max_size = max_size
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'local_hits': 0, 'redis_hits': 0, 'db_loads': 0, 'invalidations': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def _set_local(self, principal):
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_redis(self, user_id):
+        if self.redis_client is None:
+            return None
+        try:
+            value = self.redis_client.get(f'{self.prefix}{user_id}')
+        except Exception:
+            return None
+        return UserPrincipal(**json.loads(value)) if value else None
+
+    def _set_redis(self, principal):
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.set(f'{self.prefix}{principal.id}', json.dumps(principal.to_dict()), ex=self.redis_ttl)
+        except Exception:
+            pass
+
+    def get(self, user_id):
+        """The user's principal, or None if the user does not exist or is deactivated"""
+        principal = self._get_local(user_id)
+        if principal is not None:
+            self._count('local_hits')
+        else:
+            principal = self._get_redis(user_id)
+            if principal is not None:
+                self._count('redis_hits')
+            else:
+                self._count('db_loads')
+                user = db.session.get(User, user_id)
+                if user is None:
+                    return None
+                principal = UserPrincipal.from_user(user)
+                self._set_redis(principal)
+            self._set_local(principal)
+        return principal if principal.is_active else None
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._counters['invalidations'] += 1
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(f'{self.prefix}{user_id}')
+            except Exception as e:
+                print(f"Failed to evict cached principal for user {user_id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters['cached'] = len(self._entries)
+        lookups = counters['local_hits'] + counters['redis_hits'] + counters['db_loads']
+        counters['db_lookups_saved'] = lookups - counters['db_loads']
+        counters['hit_ratio'] = round(counters['db_lookups_saved'] / lookups, 4) if lookups else None
+        return counters
+
+
+# The process-wide principal cache and token service (set after app initialization)
+principal_cache = None
+token_service = None
+
+
+def init_principal_cache(cache_instance, token_service_instance=None):
+    global principal_cache, token_service
+    principal_cache = cache_instance
+    token_service = token_service_instance
+
+
+def _stale_user_ids(session):
+    return session.info.setdefault('stale_principals', set())
+
+
+def _revoked_user_ids(session):
+    return session.info.setdefault('revoked_token_users', set())
+
+
+# Mapper events only see changes flushed through the ORM unit of work. Core or bulk statements
+# (db.update(User), query.update()) bypass them: call principal_cache.invalidate() and, for
+# is_active/is_admin, token_service.revoke_user() for the affected ids after committing.
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, user):
+    state = inspect(user)
+    changed = {column for column in PRINCIPAL_COLUMNS if state.attrs[column].history.has_changes()}
+    if changed:
+        _stale_user_ids(state.session).add(user.id)
+    if changed.intersection(TOKEN_COLUMNS):
+        _revoked_user_ids(state.session).add(user.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, user):
+    session = inspect(user).session
+    _stale_user_ids(session).add(user.id)
+    _revoked_user_ids(session).add(user.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_stale_principals(session):
+    # Evict only once the change is committed, so no request can re-cache the old row meanwhile
+    user_ids = session.info.pop('stale_principals', None)
+    if user_ids and principal_cache is not None:
+        for user_id in user_ids:
+            principal_cache.invalidate(user_id)
+
+    # A deactivated user or a changed role must not keep working through already issued tokens
+    user_ids = session.info.pop('revoked_token_users', None)
+    if user_ids and token_service is not None:
+        for user_id in user_ids:
+            try:
+                token_service.revoke_user(user_id)
+            except Exception as e:
+                print(f"Failed to revoke bearer tokens of user {user_id}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale_principals(session):
+    session.info.pop('stale_principals', None)
+    session.info.pop('revoked_token_users', None)
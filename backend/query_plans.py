@@ -0,0 +1,80 @@
+"""Query-plan regression check for the hot queries"""
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, select
+from models import db, User, ParkingSpot, Reservation
+
+
+def hot_queries():
+    """(name, statement) pairs shaped like the application's hot queries"""
+    now = datetime.utcnow()
+    return [
+        ('active reservation of a user', select(Reservation.id).where(
+            Reservation.user_id == 1, Reservation.status == 'active'
+        ).limit(1)),
+        ('recent completed history of a user', select(Reservation.id).where(
+            Reservation.user_id == 1, Reservation.status == 'completed'
+        ).order_by(Reservation.leaving_timestamp.desc()).limit(10)),
+        ('latest reservation of a user', select(Reservation.id).where(
+            Reservation.user_id == 1
+        ).order_by(Reservation.created_at.desc()).limit(1)),
+        ('free spot in a lot', select(ParkingSpot.id).where(
+            ParkingSpot.lot_id == 1, ParkingSpot.status == 'A'
+        ).order_by(ParkingSpot.id).limit(1)),
+        ('lot spots with active reservations', select(ParkingSpot.id, Reservation.id, User.username).select_from(
+            ParkingSpot
+        ).outerjoin(
+            Reservation, and_(Reservation.spot_id == ParkingSpot.id, Reservation.status == 'active')
+        ).outerjoin(
+            User, User.id == Reservation.user_id
+        ).where(ParkingSpot.lot_id == 1)),
+        ('recent activity feed', select(Reservation.id).order_by(
+            Reservation.created_at.desc()
+        ).limit(10)),
+        ('active non-admin users', select(User.id).where(
+            User.is_admin == False, User.is_active == True
+        )),
+        ('admin user lookup', select(User.id).where(User.is_admin == True).limit(1)),
+        ('completed reservations in a window', select(Reservation.id).where(
+            Reservation.status == 'completed',
+            Reservation.parking_timestamp >= now - timedelta(days=1),
+            Reservation.parking_timestamp < now
+        )),
+        ('export chunk bounds in a window', select(func.min(Reservation.id), func.max(Reservation.id)).where(
+            Reservation.parking_timestamp >= now - timedelta(days=30),
+            Reservation.parking_timestamp < now
+        )),
+    ]
+
+
+def _plan(statement):
+    dialect = db.session.get_bind().dialect
+    # Literal values, as the application's constant predicates (e.g. status = 'active') are
+    # what lets the planner match partial indexes
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'postgresql':
+        db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+        rows = db.session.execute(db.text(f'EXPLAIN {sql}')).fetchall()
+        return [row[0] for row in rows]
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+    return [row[-1] for row in rows]
+
+
+def _is_full_scan(step):
+    # PostgreSQL: nested nodes read "->  Seq Scan on ...", parallel ones "Parallel Seq Scan on ..."
+    if 'Seq Scan on' in step:
+        return True
+    # SQLite: "SCAN reservations" is a table scan, "SCAN reservations USING INDEX ..." is not
+    return step.startswith('SCAN ') and 'USING' not in step and 'CONSTANT ROW' not in step
+
+
+def check_query_plans():
+    """Returns {name: plan steps} for every hot query whose plan contains a full table scan"""
+    offenders = {}
+    try:
+        for name, statement in hot_queries():
+            steps = [step.strip() for step in _plan(statement)]
+            if any(_is_full_scan(step) for step in steps):
+                offenders[name] = steps
+    finally:
+        db.session.rollback()
+    return offenders
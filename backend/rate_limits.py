@@ -0,0 +1,53 @@
+"""Fixed-window rate limits for the authentication endpoints"""
+import threading
+import time
+
+
+class LocalRateLimiter:
+    def __init__(self):
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        """Count one attempt; seconds until the window resets if this exceeds the limit, else None"""
+        now = time.time()
+        with self._lock:
+            started, count, _ = self._windows.get(key, (now, 0, window))
+            if now - started >= window:
+                started, count = now, 0
+            self._windows[key] = (started, count + 1, window)
+            # Forget finished windows now and then so one-off keys don't accumulate; each entry
+            # keeps its own window, since limits with different windows share this store
+            if len(self._windows) > 10000:
+                self._windows = {k: v for k, v in self._windows.items() if now - v[0] < v[2]}
+        if count + 1 > limit:
+            return max(1, int(started + window - now))
+        return None
+
+
+class RedisRateLimiter:
+    def __init__(self, client, prefix='ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key, limit, window):
+        window_start = int(time.time() // window * window)
+        redis_key = f'{self.prefix}{key}:{window_start}'
+        try:
+            pipe = self.client.pipeline()
+            pipe.incr(redis_key)
+            pipe.expire(redis_key, window)
+            count, _ = pipe.execute()
+        except Exception as e:
+            # Fail open: a Redis outage must not lock everyone out
+            print(f"Rate limit check failed for {key}: {e}")
+            return None
+        if count > limit:
+            return max(1, window_start + window - int(time.time()))
+        return None
+
+
+def parse_rate(rate):
+    """'10/60' -> (10 attempts, 60 second window)"""
+    limit, window = rate.split('/')
+    return int(limit), int(window)
@@ -0,0 +1,108 @@
+"""Monthly activity report pipeline"""
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import groupby
+from flask import current_app
+from models import db, User, ParkingLot, ParkingSpot, Reservation, UserMonthlyStat, duration_hours_expr
+
+# Users per report subtask
+REPORT_SHARD_SIZE = 500
+
+# Rows shown in the report's booking table
+REPORT_BOOKINGS_SHOWN = 10
+
+
+def previous_month(today=None):
+    """(first day of last month, first day of this month)"""
+    this_month_start = (today or datetime.utcnow().date()).replace(day=1)
+    return (this_month_start - timedelta(days=1)).replace(day=1), this_month_start
+
+
+def _report_users(month):
+    return db.session.query(User, UserMonthlyStat).join(
+        UserMonthlyStat, UserMonthlyStat.user_id == User.id
+    ).filter(
+        User.is_admin == False,
+        User.is_active == True,
+        UserMonthlyStat.month == month,
+        UserMonthlyStat.reservations > 0
+    )
+
+
+def report_user_shards(month, shard_size=REPORT_SHARD_SIZE):
+    """(first_user_id, last_user_id) ranges covering shard_size report recipients each"""
+    user_ids = [user_id for (user_id,) in _report_users(month).with_entities(User.id).order_by(User.id)]
+    return [
+        (user_ids[i], user_ids[min(i + shard_size, len(user_ids)) - 1])
+        for i in range(0, len(user_ids), shard_size)
+    ]
+
+
+def render_monthly_report(username, month, total_bookings, total_hours, total_spent, most_used_lot, bookings):
+    template = current_app.jinja_env.get_template('emails/monthly_report.html')
+    return template.render(
+        username=username,
+        month_label=month.strftime('%B %Y'),
+        total_bookings=total_bookings,
+        total_hours=total_hours,
+        total_spent=total_spent,
+        most_used_lot=most_used_lot,
+        bookings=bookings
+    )
+
+
+def iter_monthly_reports(month, first_user_id, last_user_id, batch_size=5000):
+    """(user, html) for every report recipient with an id in [first_user_id, last_user_id]"""
+    month_end = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    recipients = {
+        user.id: (user, stats)
+        for user, stats in _report_users(month).filter(User.id.between(first_user_id, last_user_id))
+    }
+
+    rows = db.session.execute(
+        db.select(
+            Reservation.user_id, Reservation.parking_timestamp,
+            duration_hours_expr(Reservation.parking_timestamp, Reservation.leaving_timestamp).label('duration_hours'),
+            Reservation.parking_cost, ParkingSpot.spot_number, ParkingLot.prime_location_name
+        ).join(
+            ParkingSpot, ParkingSpot.id == Reservation.spot_id
+        ).join(
+            ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+        ).where(
+            Reservation.user_id.between(first_user_id, last_user_id),
+            Reservation.status == 'completed',
+            Reservation.parking_timestamp >= month,
+            Reservation.parking_timestamp < month_end
+        ).order_by(
+            Reservation.user_id, Reservation.parking_timestamp
+        ).execution_options(yield_per=batch_size)
+    )
+
+    for user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+        if user_id not in recipients:
+            continue
+        user, stats = recipients.pop(user_id)
+
+        lot_usage = Counter()
+        bookings = []
+        for row in user_rows:
+            lot_usage[row.prime_location_name] += 1
+            if len(bookings) < REPORT_BOOKINGS_SHOWN:
+                bookings.append({
+                    'parking_timestamp': row.parking_timestamp,
+                    'prime_location_name': row.prime_location_name,
+                    'spot_number': row.spot_number,
+                    'duration_hours': row.duration_hours,
+                    'parking_cost': row.parking_cost
+                })
+
+        most_used_lot = lot_usage.most_common(1)[0][0]
+        yield user, render_monthly_report(
+            user.username, month, stats.reservations, stats.hours, stats.revenue, most_used_lot, bookings
+        )
+
+    # Rollup says they parked but no completed rows matched (e.g. rollups not yet rebuilt)
+    for user, stats in recipients.values():
+        yield user, render_monthly_report(
+            user.username, month, stats.reservations, stats.hours, stats.revenue, 'N/A', []
+        )
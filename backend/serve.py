@@ -0,0 +1,15 @@
+"""Production server runner"""
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+if __name__ == '__main__':
+    # Migrate in a child process so no worker inherits its connections (or imports app before gevent patches)
+    subprocess.run(
+        [sys.executable, '-c', 'from app import init_database; init_database()'],
+        cwd=BACKEND_DIR, check=True
+    )
+    os.chdir(BACKEND_DIR)
+    os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', *sys.argv[1:], 'wsgi:app'])
@@ -0,0 +1,60 @@
+"""SQLite engine profile for single-node deployments"""
+import random
+import time
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from models import db
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,         # milliseconds
+    'mmap_size': 268435456,       # 256 MB of the file memory-mapped
+    'cache_size': -65536,         # negative = KiB, i.e. 64 MB page cache per connection
+    'temp_store': 'MEMORY'
+}
+
+
+def apply_sqlite_profile(engine, pragmas=None):
+    """Run the profile pragmas on every connection the engine opens (no-op for other databases)"""
+    if engine.dialect.name != 'sqlite':
+        return False
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    # Connections opened before the listener existed miss the pragmas
+    engine.dispose()
+    return True
+
+
+def is_database_locked(error):
+    """True for SQLite's transient 'database is locked' / 'database table is locked' errors"""
+    return isinstance(error, OperationalError) and 'is locked' in str(error.orig)
+
+
+def retry_on_locked(attempts=5, base_delay=0.05, max_delay=1.0):
+    """
+    Retry the wrapped function when SQLite reports the database as locked.
+    The session is rolled back before each retry; the last error is re-raised.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return f(*args, **kwargs)
+                except OperationalError as e:
+                    if not is_database_locked(e) or attempt == attempts - 1:
+                        raise
+                    db.session.rollback()
+                    delay = min(max_delay, base_delay * 2 ** attempt)
+                    time.sleep(random.uniform(delay / 2, delay))
+        return decorated_function
+    return decorator
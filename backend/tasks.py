@@ -1,114 +1,305 @@
-from app import celery, app
+from app import celery, app, redis_client
 from models import db, User, ParkingLot, Reservation
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timezone
+from exports import (
+    export_filename, write_history_csv, purge_expired_exports,
+    plan_reservation_chunks, write_reservation_part, finalize_reservation_export, EXPORT_CHUNK_SIZE
+)
+from job_runs import exclusive_run, finish_run
+from mailer import get_mailer
+from reports import previous_month, report_user_shards, iter_monthly_reports
+from celery import chord, group
 from sqlalchemy import func
-import csv
-import io
-import smtplib
+import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 
+# Users per reminder subtask
+REMINDER_BATCH_SIZE = 500
+
+
+def inactive_user_batches(since, batch_size=REMINDER_BATCH_SIZE):
+    """
+    Ids of active non-admin users with no reservation created since `since`, in id order,
+    batch_size at a time. One anti-join per batch, paged by id (no per-user queries).
+    """
+    booked_since = db.session.query(Reservation.id).filter(
+        Reservation.user_id == User.id,
+        Reservation.created_at >= since
+    ).exists()
+    
+    last_id = 0
+    while True:
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(
+            User.is_admin == False,
+            User.is_active == True,
+            User.id > last_id,
+            ~booked_since
+        ).order_by(User.id).limit(batch_size)]
+        
+        if not user_ids:
+            return
+        yield user_ids
+        last_id = user_ids[-1]
+
+
 @celery.task
 def send_daily_reminder():
     """
     Daily reminder job - Check users who haven't booked and send notification
-    Runs every day at 6 PM
+    Runs every day at 6 PM; sending fans out into send_reminder_batch subtasks
     """
     try:
-        today = datetime.now(timezone.utc).date()
-        users = User.query.filter_by(is_admin=False, is_active=True).all()
-        
-        inactive_users = []
-        for user in users:
-            last_reservation = Reservation.query.filter_by(user_id=user.id).order_by(
-                Reservation.created_at.desc()
-            ).first()
+        with app.app_context():
+            today = datetime.combine(datetime.now(timezone.utc).date(), datetime.min.time())
             
-            if not last_reservation or last_reservation.created_at.date() < today:
-                inactive_users.append(user)
-        
-        if inactive_users:
-            for user in inactive_users:
-                send_reminder_notification(user)
-        
-        return f"Daily reminders sent to {len(inactive_users)} users"
+            with exclusive_run('send_daily_reminder', today.date().isoformat(), redis_client) as run:
+                if run is None:
+                    return f"Daily reminders for {today.date()} already sent or in progress"
+                
+                batches = [
+                    send_reminder_batch.s(user_ids, today.date().isoformat())
+                    for user_ids in inactive_user_batches(today)
+                ]
+                run.detail = f"Daily reminders queued in {len(batches)} batches"
+                if batches:
+                    dispatch_shards(run, group(batches))
+                return run.detail
     
     except Exception as e:
         return f"Error: {str(e)}"
 
 
+@celery.task(bind=True, max_retries=3, default_retry_delay=300)
+def send_reminder_batch(self, user_ids, day):
+    """Send the daily reminder to one batch of users"""
+    with app.app_context():
+        def build_messages():
+            users = User.query.filter(User.id.in_(user_ids)).order_by(User.id).all()
+            return [build_reminder_email(user) for user in users]
+        
+        return send_shard(self, 'send_daily_reminder', day, user_ids[0], user_ids[-1], build_messages)
+
+
 @celery.task
 def generate_monthly_report():
     """
     Monthly activity report - Generate and send report to all users
-    Runs on 1st of every month at 9 AM
+    Runs on 1st of every month at 9 AM; fans out into send_monthly_report_shard subtasks
     """
     try:
-        users = User.query.filter_by(is_admin=False, is_active=True).all()
-        
-        last_month = datetime.utcnow().replace(day=1) - timedelta(days=1)
-        month_start = last_month.replace(day=1)
-        month_end = last_month.replace(day=1) + timedelta(days=32)
-        month_end = month_end.replace(day=1) - timedelta(days=1)
-        
-        reports_sent = 0
-        for user in users:
-            reservations = Reservation.query.filter(
-                Reservation.user_id == user.id,
-                Reservation.created_at >= month_start,
-                Reservation.created_at <= month_end
-            ).all()
+        with app.app_context():
+            last_month, _ = previous_month()
             
-            if reservations:
-                report_html = generate_report_html(user, reservations, last_month)
-                send_email_report(user, report_html, last_month)
-                reports_sent += 1
-        
-        return f"Monthly reports sent to {reports_sent} users"
+            with exclusive_run('generate_monthly_report', last_month.strftime('%Y-%m'), redis_client) as run:
+                if run is None:
+                    return f"Monthly reports for {last_month:%B %Y} already sent or in progress"
+                
+                # The monthly rollup already knows which users parked last month and their totals
+                shards = report_user_shards(last_month)
+                run.detail = f"Monthly reports queued in {len(shards)} shards"
+                if shards:
+                    dispatch_shards(run, group(
+                        send_monthly_report_shard.s(last_month.isoformat(), first_user_id, last_user_id)
+                        for first_user_id, last_user_id in shards
+                    ))
+                return run.detail
     
     except Exception as e:
         return f"Error: {str(e)}"
 
 
+@celery.task(bind=True, max_retries=3, default_retry_delay=300)
+def send_monthly_report_shard(self, month, first_user_id, last_user_id):
+    """Render and send the monthly reports of one user id shard"""
+    with app.app_context():
+        month = date.fromisoformat(month)
+        subject = f"Your Parking Activity Report - {month.strftime('%B %Y')}"
+        
+        def build_messages():
+            return [
+                build_email(
+                    user.email, subject, f"Hello {user.username}, Your monthly parking report is attached.", html
+                )
+                for user, html in iter_monthly_reports(month, first_user_id, last_user_id)
+            ]
+        
+        return send_shard(
+            self, 'generate_monthly_report', month.strftime('%Y-%m'), first_user_id, last_user_id, build_messages
+        )
+
+
+def dispatch_shards(run, header):
+    """
+    Send a job's shards as a chord. The period only counts as done once every shard has been
+    delivered: the chord callbacks complete or fail the dispatched run.
+    """
+    callback = dispatched_run_completed.s(run.id).on_error(dispatched_run_failed.s(run_id=run.id))
+    # Committed first, so a fast chord callback can't be overwritten when the run's block exits
+    run.status = 'dispatched'
+    db.session.commit()
+    chord(header)(callback)
+
+
+def send_shard(task, job, period, first_user_id, last_user_id, build_messages):
+    """
+    Deliver one shard under its own ledger row, so rerunning the period only resends the shards
+    that failed. Partial delivery fails the shard, and the task is retried.
+    """
+    label = f'users {first_user_id}-{last_user_id}'
+    try:
+        with exclusive_run(f'{job}:{label}', period) as run:
+            if run is None:
+                return f"{job} for {label} already sent or in progress"
+            
+            messages = build_messages()
+            # One SMTP session for the whole shard
+            sent = get_mailer().send_batch(messages, label=f'{job} for {label}')
+            if sent < len(messages):
+                raise RuntimeError(f"Only {sent} of {len(messages)} messages delivered")
+            run.detail = f"Sent to {sent} users"
+            return run.detail
+    except Exception as e:
+        raise task.retry(exc=e)
+
+
+@celery.task
+def dispatched_run_completed(results, run_id):
+    """Chord callback: every shard of the run was delivered"""
+    with app.app_context():
+        finish_run(run_id, 'completed', f"Sent in {len(results)} shards")
+
+
+@celery.task
+def dispatched_run_failed(request, exc, traceback, run_id):
+    """Chord error callback: a shard gave up after its retries; rerunning the job resends the failed shards"""
+    with app.app_context():
+        finish_run(run_id, 'failed', f"Shard {request.id} failed: {exc}")
+
+
 @celery.task
 def export_user_parking_history(user_id):
     """
     Export user parking history to CSV - User triggered async job
-    Sends email with CSV attachment using MailHog
+    Streams the CSV to a file in EXPORT_DIR, then emails it using MailHog
     """
     try:
         with app.app_context():
-            user = User.query.get(user_id)
+            user = db.session.get(User, user_id)
             if not user:
                 return {"status": "error", "message": "User not found"}
             
-            reservations = Reservation.query.filter_by(user_id=user_id).order_by(
-                Reservation.created_at.desc()
-            ).all()
-            
-            if not reservations:
+            if not db.session.query(Reservation.id).filter_by(user_id=user_id).first():
                 return {"status": "error", "message": "No parking history found"}
             
-            csv_content = generate_csv_export(reservations)
+            compress = app.config['EXPORT_COMPRESS']
+            os.makedirs(app.config['EXPORT_DIR'], exist_ok=True)
+            filename = export_filename(user_id, compress)
+            path = os.path.join(app.config['EXPORT_DIR'], filename)
+            records = write_history_csv(user_id, path, compress=compress)
             
-            # Send email with CSV attachment
-            send_csv_notification(user, csv_content)
+            # Send email with CSV attachment (or a download link if too large)
+            send_csv_notification(user, path)
             
             return {
                 "status": "success",
                 "message": f"CSV export completed for {user.username}",
-                "records_exported": len(reservations)
+                "records_exported": records,
+                "file": filename
             }
     
     except Exception as e:
         return {"status": "error", "message": f"Export failed: {str(e)}"}
 
 
-def send_reminder_notification(user):
+@celery.task(bind=True)
+def export_all_reservations(self, start, end, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Export every reservation parked in [start, end) - Admin triggered async job
+    Fans the id range out as one export_reservation_chunk task per chunk; a chord callback
+    merges the part files and writes the manifest once all of them have finished
     """
-    Send reminder notification to user
+    try:
+        with app.app_context():
+            export_id = self.request.id or datetime.utcnow().strftime('%Y%m%d%H%M%S')
+            export_dir = os.path.join(app.config['EXPORT_DIR'], f'reservations_{export_id}')
+            os.makedirs(export_dir, exist_ok=True)
+            
+            chunks = plan_reservation_chunks(
+                datetime.fromisoformat(start), datetime.fromisoformat(end), chunk_size
+            )
+            if not chunks:
+                return {
+                    "status": "success",
+                    "message": "No reservations in this date range",
+                    "export_id": export_id,
+                    "manifest": finalize_reservation_export(export_dir, [], start, end)
+                }
+            
+            header = group(
+                export_reservation_chunk.s(export_dir, index, start, end, id_from, id_to)
+                for index, (id_from, id_to) in enumerate(chunks)
+            )
+            result = chord(header)(finish_reservation_export.s(export_dir, start, end))
+            chunk_results = result.parent
+            if chunk_results is not None:
+                # Saved so the status endpoint can count finished chunks (absent when tasks run eagerly)
+                chunk_results.save()
+            
+            return {
+                "status": "running",
+                "export_id": export_id,
+                "chunks": len(chunks),
+                "group_id": chunk_results.id if chunk_results is not None else None,
+                "finalize_id": result.id
+            }
+    
+    except Exception as e:
+        return {"status": "error", "message": f"Export failed: {str(e)}"}
+
+
+@celery.task
+def export_reservation_chunk(export_dir, index, start, end, id_from, id_to):
+    """Write one id chunk of the admin reservation export to its own gzip part file"""
+    with app.app_context():
+        filename = f'part-{index:05d}.csv.gz'
+        path = os.path.join(export_dir, filename)
+        rows = write_reservation_part(
+            path, datetime.fromisoformat(start), datetime.fromisoformat(end), id_from, id_to
+        )
+        return {
+            "file": filename,
+            "id_from": id_from,
+            "id_to": id_to,
+            "rows": rows,
+            "bytes": os.path.getsize(path)
+        }
+
+
+@celery.task
+def finish_reservation_export(parts, export_dir, start, end):
+    """Chord callback: merge the finished parts and write manifest.json"""
+    manifest = finalize_reservation_export(export_dir, parts, start, end)
+    return {
+        "status": "success",
+        "message": f"Exported {manifest['rows']} reservations in {len(parts)} parts",
+        "manifest": manifest
+    }
+
+
+@celery.task
+def purge_old_exports():
+    """Daily cleanup - delete export files older than EXPORT_RETENTION_DAYS"""
+    with app.app_context():
+        removed = purge_expired_exports(app.config['EXPORT_DIR'], app.config['EXPORT_RETENTION_DAYS'])
+        return f"Removed {removed} expired exports"
+
+
+def build_reminder_email(user):
+    """
+    Reminder notification for a user
     Can use email, SMS, or Google Chat webhook
     """
     subject = "Parking Reminder - Book Your Spot Today!"
@@ -126,190 +317,66 @@ def send_reminder_notification(user):
     Vehicle Parking Management System
     """
     
-    send_email(user.email, subject, message)
-
-
-def generate_report_html(user, reservations, month):
-    """
-    Generate HTML monthly activity report
-    """
-    total_bookings = len(reservations)
-    total_spent = sum(r.parking_cost or 0 for r in reservations)
-    total_hours = sum(r.get_duration_hours() for r in reservations)
-    
-    lot_usage = {}
-    for res in reservations:
-        lot_name = res.parking_spot.parking_lot.prime_location_name
-        lot_usage[lot_name] = lot_usage.get(lot_name, 0) + 1
-    
-    most_used_lot = max(lot_usage.items(), key=lambda x: x[1])[0] if lot_usage else "N/A"
-    
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            .header {{ background: #667eea; color: white; padding: 20px; text-align: center; }}
-            .content {{ padding: 20px; }}
-            .stat-box {{ display: inline-block; margin: 10px; padding: 15px; background: #f0f0f0; border-radius: 5px; }}
-            .stat-label {{ font-size: 12px; color: #666; }}
-            .stat-value {{ font-size: 24px; font-weight: bold; color: #333; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-            th {{ background-color: #667eea; color: white; }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>Monthly Parking Activity Report</h1>
-            <p>{month.strftime('%B %Y')}</p>
-        </div>
-        <div class="content">
-            <h2>Hello {user.username},</h2>
-            <p>Here's your parking activity summary for {month.strftime('%B %Y')}:</p>
-            
-            <div style="text-align: center;">
-                <div class="stat-box">
-                    <div class="stat-label">Total Bookings</div>
-                    <div class="stat-value">{total_bookings}</div>
-                </div>
-                <div class="stat-box">
-                    <div class="stat-label">Total Hours</div>
-                    <div class="stat-value">{total_hours:.1f}</div>
-                </div>
-                <div class="stat-box">
-                    <div class="stat-label">Total Spent</div>
-                    <div class="stat-value">₹{total_spent:.2f}</div>
-                </div>
-                <div class="stat-box">
-                    <div class="stat-label">Most Used Lot</div>
-                    <div class="stat-value" style="font-size: 16px;">{most_used_lot}</div>
-                </div>
-            </div>
-            
-            <h3>Booking History</h3>
-            <table>
-                <thead>
-                    <tr>
-                        <th>Date</th>
-                        <th>Parking Lot</th>
-                        <th>Spot</th>
-                        <th>Duration (hrs)</th>
-                        <th>Cost (₹)</th>
-                    </tr>
-                </thead>
-                <tbody>
-    """
-    
-    for res in reservations[:10]:
-        html += f"""
-                    <tr>
-                        <td>{res.parking_timestamp.strftime('%d %b %Y')}</td>
-                        <td>{res.parking_spot.parking_lot.prime_location_name}</td>
-                        <td>{res.parking_spot.spot_number}</td>
-                        <td>{res.get_duration_hours():.1f}</td>
-                        <td>₹{res.parking_cost or 0:.2f}</td>
-                    </tr>
-        """
-    
-    html += """
-                </tbody>
-            </table>
-            <p style="margin-top: 20px; color: #666;">
-                Thank you for using our parking management system!
-            </p>
-        </div>
-    </body>
-    </html>
-    """
-    
-    return html
+    return build_email(user.email, subject, message)
 
 
-def generate_csv_export(reservations):
+def build_email(to_email, subject, body, html_body=None, attachment=None, attachment_name='parking_history.csv'):
     """
-    Generate CSV export of parking history
+    Build an email message (plain text, optional HTML alternative and attachment)
     """
-    output = io.StringIO()
-    writer = csv.writer(output)
+    msg = MIMEMultipart('alternative')
+    msg['From'] = get_mailer().sender
+    msg['To'] = to_email
+    msg['Subject'] = subject
     
-    writer.writerow([
-        'Reservation ID', 'Parking Lot', 'Spot Number', 'Vehicle Number',
-        'Parked At', 'Left At', 'Duration (hrs)', 'Cost', 'Status'
-    ])
+    if html_body:
+        part1 = MIMEText(body, 'plain')
+        part2 = MIMEText(html_body, 'html')
+        msg.attach(part1)
+        msg.attach(part2)
+    else:
+        msg.attach(MIMEText(body, 'plain'))
     
-    for res in reservations:
-        writer.writerow([
-            res.id,
-            res.parking_spot.parking_lot.prime_location_name,
-            res.parking_spot.spot_number,
-            res.vehicle_number,
-            res.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            res.leaving_timestamp.strftime('%Y-%m-%d %H:%M:%S') if res.leaving_timestamp else 'Active',
-            f"{res.get_duration_hours():.2f}",
-            f"{res.parking_cost or 0:.2f}",
-            res.status
-        ])
+    if attachment:
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(attachment)
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f'attachment; filename={attachment_name}')
+        msg.attach(part)
     
-    return output.getvalue()
+    return msg
 
 
-def send_email(to_email, subject, body, html_body=None, attachment=None):
+def send_email(to_email, subject, body, html_body=None, attachment=None, attachment_name='parking_history.csv'):
     """
     Send email using MailHog SMTP for local testing
     MailHog runs on localhost:1025 and provides a web UI at localhost:8025
+    Goes over this worker's persistent SMTP connection (see mailer.py)
     """
     try:
-        # MailHog SMTP Configuration
-        SMTP_SERVER = 'localhost'
-        SMTP_PORT = 1025
-        SENDER_EMAIL = 'parking-system@localhost'
-        
-        msg = MIMEMultipart('alternative')
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        if html_body:
-            part1 = MIMEText(body, 'plain')
-            part2 = MIMEText(html_body, 'html')
-            msg.attach(part1)
-            msg.attach(part2)
-        else:
-            msg.attach(MIMEText(body, 'plain'))
-        
-        if attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment)
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', 'attachment; filename=parking_history.csv')
-            msg.attach(part)
-        
-        # Connect to MailHog SMTP (no authentication needed)
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.send_message(msg)
-        
-        return True
+        msg = build_email(to_email, subject, body, html_body, attachment, attachment_name)
+        return get_mailer().send(msg)
         
     except Exception as e:
         print(f"Email sending failed: {e}")
         return False
-def send_email_report(user, html_content, month):
-    """
-    Send monthly report via email
-    """
-    subject = f"Your Parking Activity Report - {month.strftime('%B %Y')}"
-    plain_text = f"Hello {user.username}, Your monthly parking report is attached."
-    
-    send_email(user.email, subject, plain_text, html_content)
 
 
-def send_csv_notification(user, csv_content):
+def send_csv_notification(user, export_path):
     """
-    Send CSV export via email
+    Send CSV export via email, attached when it fits under EXPORT_ATTACHMENT_MAX_BYTES
     """
     subject = "Your Parking History Export"
-    body = f"Hello {user.username},\n\nYour parking history export is ready and attached to this email."
+    filename = os.path.basename(export_path)
+    size = os.path.getsize(export_path)
     
-    send_email(user.email, subject, body, attachment=csv_content.encode())
+    if size > app.config['EXPORT_ATTACHMENT_MAX_BYTES']:
+        body = (f"Hello {user.username},\n\nYour parking history export is ready. It is too large to attach "
+                f"({size / (1024 * 1024):.1f} MB); download it after logging in from "
+                f"{app.config['PUBLIC_BASE_URL']}/api/user/exports/{filename}")
+        send_email(user.email, subject, body)
+        return
+    
+    body = f"Hello {user.username},\n\nYour parking history export is ready and attached to this email."
+    with open(export_path, 'rb') as f:
+        send_email(user.email, subject, body, attachment=f.read(), attachment_name=filename)
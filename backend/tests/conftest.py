@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.remove(_db_path)
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ.setdefault('TOKEN_SECRET_KEY', 'test-token-secret')
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+os.environ.setdefault('LOGIN_RATE_LIMIT_PER_IP', '1000/60')
+os.environ.setdefault('REGISTER_RATE_LIMIT_PER_IP', '1000/60')
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as app_module
+    app_module.init_database()
+    yield app_module.app
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(_db_path + suffix):
+            os.remove(_db_path + suffix)
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin123'})
+    return client
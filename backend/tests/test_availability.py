@@ -0,0 +1,24 @@
+import uuid
+
+import controllers
+
+
+def test_lot_admin_changes_publish_events(admin_client):
+    broker = controllers.availability_broker
+    subscriber = broker.subscribe()
+    try:
+        lot_id = admin_client.post('/api/admin/parking-lots', json={
+            'name': f'Lot {uuid.uuid4().hex[:6]}', 'price': 10, 'address': '-', 'pin_code': '000000',
+            'number_of_spots': 3
+        }).json['parking_lot']['id']
+        admin_client.put(f'/api/admin/parking-lots/{lot_id}', json={'price': 12})
+        admin_client.delete(f'/api/admin/parking-lots/{lot_id}')
+
+        events = [subscriber.get(timeout=1) for _ in range(3)]
+    finally:
+        broker.unsubscribe(subscriber)
+
+    assert [(event['lot_id'], event['change']) for event in events] == [
+        (lot_id, 'created'), (lot_id, 'updated'), (lot_id, 'deleted')
+    ]
+    assert events[0]['available_spots'] == 3
@@ -0,0 +1,10 @@
+import uuid
+
+
+def test_registration_refreshes_cached_dashboard(app, admin_client):
+    before = admin_client.get('/api/admin/dashboard').json['dashboard']['users']['total']
+    name = f'd{uuid.uuid4().hex[:8]}'
+    app.test_client().post('/api/auth/register', json={
+        'username': name, 'email': f'{name}@example.com', 'password': 'pw'
+    })
+    assert admin_client.get('/api/admin/dashboard').json['dashboard']['users']['total'] == before + 1
@@ -0,0 +1,20 @@
+import os
+import time
+
+from exports import purge_expired_exports
+
+
+def test_purge_removes_only_expired_exports(tmp_path):
+    old_file = tmp_path / 'parking_history_1_20260101000000.csv'
+    old_dir = tmp_path / 'reservations_abc'
+    new_file = tmp_path / 'parking_history_2_20260301000000.csv'
+    old_file.write_text('x')
+    old_dir.mkdir()
+    (old_dir / 'manifest.json').write_text('{}')
+    new_file.write_text('x')
+    expired = time.time() - 8 * 24 * 3600
+    for path in (old_file, old_dir):
+        os.utime(path, (expired, expired))
+
+    assert purge_expired_exports(str(tmp_path), 7) == 2
+    assert [path.name for path in tmp_path.iterdir()] == [new_file.name]
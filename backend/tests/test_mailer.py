@@ -0,0 +1,71 @@
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+import mailer
+from mailer import SMTPMailer
+
+
+class FakeSMTP:
+    errors = []
+    attempts = 0
+    in_flight = 0
+    overlapped = False
+
+    def __init__(self, host, port, timeout=None):
+        pass
+
+    def send_message(self, msg):
+        FakeSMTP.attempts += 1
+        FakeSMTP.in_flight += 1
+        FakeSMTP.overlapped |= FakeSMTP.in_flight > 1
+        time.sleep(0.001)
+        FakeSMTP.in_flight -= 1
+        if FakeSMTP.errors:
+            raise FakeSMTP.errors.pop(0)
+
+    def quit(self):
+        pass
+
+
+def _mailer(monkeypatch, errors):
+    monkeypatch.setattr(mailer.smtplib, 'SMTP', FakeSMTP)
+    FakeSMTP.errors, FakeSMTP.attempts, FakeSMTP.overlapped = list(errors), 0, False
+    return SMTPMailer(retry_delay=0)
+
+
+def _message(to='user@example.com'):
+    msg = MIMEText('Hello')
+    msg['To'] = to
+    return msg
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    smtp = _mailer(monkeypatch, [
+        smtplib.SMTPServerDisconnected('dropped'),
+        smtplib.SMTPDataError(451, b'try again later')
+    ])
+    assert smtp.send(_message()) is True
+    assert FakeSMTP.attempts == 3
+
+
+def test_permanent_errors_are_not_retried(monkeypatch):
+    smtp = _mailer(monkeypatch, [smtplib.SMTPRecipientsRefused({'user@example.com': (550, b'no such user')})])
+    assert smtp.send(_message()) is False
+    assert FakeSMTP.attempts == 1
+
+    smtp = _mailer(monkeypatch, [smtplib.SMTPDataError(554, b'rejected')])
+    assert smtp.send(_message()) is False
+    assert FakeSMTP.attempts == 1
+
+
+def test_threads_take_turns_on_the_connection(monkeypatch):
+    smtp = _mailer(monkeypatch, [])
+    threads = [threading.Thread(target=smtp.send_batch, args=([_message() for _ in range(10)],)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert FakeSMTP.attempts == 40
+    assert not FakeSMTP.overlapped
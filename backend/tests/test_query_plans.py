@@ -0,0 +1,34 @@
+from query_plans import _is_full_scan
+
+
+NESTED_POSTGRES_PLAN = """\
+Limit  (cost=0.29..25.61 rows=10 width=4)
+  ->  Nested Loop  (cost=0.29..2532.40 rows=1000 width=4)
+        ->  Index Scan using ix_reservations_created_at on reservations  (cost=0.29..85.40 rows=1000 width=8)
+        ->  Seq Scan on users  (cost=0.00..2.40 rows=1 width=4)
+              Filter: (id = reservations.user_id)
+"""
+
+
+def test_nested_postgres_seq_scan_is_flagged():
+    steps = [step.strip() for step in NESTED_POSTGRES_PLAN.splitlines()]
+    assert [step for step in steps if _is_full_scan(step)] == [steps[3]]
+
+
+def test_postgres_index_and_parallel_scans():
+    assert not _is_full_scan('->  Index Only Scan using ix_parking_spots_lot_status on parking_spots')
+    assert not _is_full_scan('->  Bitmap Heap Scan on reservations')
+    assert _is_full_scan('->  Parallel Seq Scan on reservations  (cost=0.00..1234.00 rows=1 width=4)')
+    assert _is_full_scan('Seq Scan on parking_lots  (cost=0.00..1.05 rows=5 width=4)')
+
+
+def test_sqlite_scans():
+    assert _is_full_scan('SCAN reservations')
+    assert not _is_full_scan('SCAN reservations USING INDEX ix_reservations_created_at')
+    assert not _is_full_scan('SEARCH parking_spots USING INDEX ix_parking_spots_lot_status (lot_id=? AND status=?)')
+
+
+def test_hot_queries_use_indexes(app):
+    from query_plans import check_query_plans
+    with app.app_context():
+        assert check_query_plans() == {}
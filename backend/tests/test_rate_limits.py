@@ -0,0 +1,16 @@
+from rate_limits import LocalRateLimiter
+
+
+def test_pruning_keeps_entries_of_longer_windows(monkeypatch):
+    limiter = LocalRateLimiter()
+    clock = [1000.0]
+    monkeypatch.setattr('rate_limits.time.time', lambda: clock[0])
+
+    for _ in range(3):
+        limiter.hit('register:1.2.3.4', 3, 3600)
+    clock[0] += 120
+    # Enough short-window keys to trigger a prune while the hour-long window is still open
+    for i in range(10001):
+        limiter.hit(f'login:{i}', 10, 60)
+
+    assert limiter.hit('register:1.2.3.4', 3, 3600) is not None
@@ -0,0 +1,62 @@
+import threading
+import uuid
+
+from models import db, Reservation, ParkingSpot, LotDailyStat, UserMonthlyStat
+
+
+def _user_client(app):
+    name = f'u{uuid.uuid4().hex[:8]}'
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': name, 'email': f'{name}@example.com', 'password': 'pw'})
+    client.post('/api/auth/login', json={'username': name, 'password': 'pw'})
+    return client
+
+
+def _booked_reservation(app, admin_client):
+    lot_id = admin_client.post('/api/admin/parking-lots', json={
+        'name': f'Lot {uuid.uuid4().hex[:6]}', 'price': 10, 'address': '-', 'pin_code': '000000',
+        'number_of_spots': 2
+    }).json['parking_lot']['id']
+    client = _user_client(app)
+    response = client.post('/api/user/book-spot', json={'lot_id': lot_id})
+    assert response.status_code in (200, 201), response.json
+    return client, lot_id, response.json['reservation']['id']
+
+
+def test_concurrent_release_completes_once(app, admin_client):
+    client, lot_id, reservation_id = _booked_reservation(app, admin_client)
+    barrier = threading.Barrier(2)
+    statuses = []
+
+    def release():
+        barrier.wait()
+        statuses.append(client.post(f'/api/user/release-spot/{reservation_id}').status_code)
+
+    threads = [threading.Thread(target=release) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200, 400]
+    with app.app_context():
+        reservation = db.session.get(Reservation, reservation_id)
+        assert reservation.status == 'completed'
+        assert LotDailyStat.query.filter_by(lot_id=lot_id).one().reservations == 1
+        assert UserMonthlyStat.query.filter_by(user_id=reservation.user_id).one().reservations == 1
+        assert ParkingSpot.query.filter_by(lot_id=lot_id, status='A').count() == 2
+
+
+def test_stale_reservation_is_not_completed_twice(app, admin_client):
+    _, lot_id, reservation_id = _booked_reservation(app, admin_client)
+    with app.app_context():
+        reservation = db.session.get(Reservation, reservation_id)
+        # Another request completes it after this one loaded the row
+        db.session.execute(
+            db.update(Reservation).where(Reservation.id == reservation_id).values(status='completed')
+            .execution_options(synchronize_session=False)
+        )
+        assert reservation.status == 'active'
+        assert reservation.complete_reservation() is False
+        db.session.rollback()
+        assert LotDailyStat.query.filter_by(lot_id=lot_id).count() == 0
@@ -0,0 +1,30 @@
+import uuid
+
+import pytest
+
+from models import db, User
+
+
+def _token_user(app):
+    name = f't{uuid.uuid4().hex[:8]}'
+    app.test_client().post('/api/auth/register', json={
+        'username': name, 'email': f'{name}@example.com', 'password': 'pw'
+    })
+    # A fresh client, so only the bearer token authenticates it
+    client = app.test_client()
+    tokens = client.post('/api/auth/token', json={'username': name, 'password': 'pw'}).json
+    with app.app_context():
+        user_id = User.query.filter_by(username=name).one().id
+    return client, user_id, {'Authorization': f"Bearer {tokens['access_token']}"}
+
+
+@pytest.mark.parametrize('column, value', [('is_active', False), ('is_admin', True)])
+def test_account_change_revokes_tokens(app, column, value):
+    client, user_id, headers = _token_user(app)
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+
+    with app.app_context():
+        setattr(db.session.get(User, user_id), column, value)
+        db.session.commit()
+
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
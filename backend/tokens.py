@@ -0,0 +1,119 @@
+"""Signed bearer tokens (stateless auth mode)"""
+import threading
+import time
+import uuid
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from principals import UserPrincipal
+
+
+class LocalRevocationList:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, value, ttl, only_new=False):
+        """Store the entry; with only_new, only if it isn't already there (returns whether it was stored)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if only_new and entry and entry[1] > now:
+                return False
+            self._entries[key] = (value, now + ttl)
+            if len(self._entries) > 100000:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+            return True
+
+    def get_many(self, keys):
+        now = time.time()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                values.append(entry[0] if entry and entry[1] > now else None)
+        return values
+
+
+class RedisRevocationList:
+    def __init__(self, client, prefix='revoked:'):
+        self.client = client
+        self.prefix = prefix
+
+    def add(self, key, value, ttl, only_new=False):
+        return bool(self.client.set(f'{self.prefix}{key}', value, ex=max(1, int(ttl)), nx=only_new))
+
+    def get_many(self, keys):
+        values = self.client.mget([f'{self.prefix}{key}' for key in keys])
+        return [float(value) if value is not None else None for value in values]
+
+
+class TokenService:
+    def __init__(self, secret_key, revocations, access_ttl=900, refresh_ttl=14 * 24 * 3600):
+        self.revocations = revocations
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self._serializers = {
+            'access': URLSafeTimedSerializer(secret_key, salt='parking-access-token'),
+            'refresh': URLSafeTimedSerializer(secret_key, salt='parking-refresh-token')
+        }
+
+    def issue(self, user):
+        """Access and refresh token for an authenticated, active user"""
+        issued_at = time.time()
+        access = {
+            'sub': user.id, 'name': user.username, 'email': user.email, 'adm': user.is_admin,
+            'act': user.is_active, 'jti': uuid.uuid4().hex, 'iat': issued_at
+        }
+        refresh = {'sub': user.id, 'jti': uuid.uuid4().hex, 'iat': issued_at}
+        return {
+            'access_token': self._serializers['access'].dumps(access),
+            'refresh_token': self._serializers['refresh'].dumps(refresh),
+            'token_type': 'Bearer',
+            'expires_in': self.access_ttl
+        }
+
+    def verify(self, token, kind='access'):
+        """The token's payload, or None if it is forged, expired or revoked"""
+        max_age = self.access_ttl if kind == 'access' else self.refresh_ttl
+        try:
+            payload = self._serializers[kind].loads(token, max_age=max_age)
+        except (BadSignature, SignatureExpired):
+            return None
+
+        try:
+            token_revoked, user_cutoff = self.revocations.get_many([
+                f"token:{payload['jti']}", f"user:{payload['sub']}"
+            ])
+        except Exception as e:
+            # Fail closed: without the revocation list a revoked token can't be told apart
+            print(f"Token revocation check failed: {e}")
+            return None
+        if token_revoked is not None or (user_cutoff is not None and payload['iat'] <= user_cutoff):
+            return None
+        return payload
+
+    def principal(self, token):
+        payload = self.verify(token, 'access')
+        if payload is None:
+            return None
+        # Tokens issued before the 'act' claim existed are treated as inactive and must be refreshed
+        principal = UserPrincipal(
+            payload['sub'], payload['name'], payload['email'], payload['adm'], payload.get('act', False)
+        )
+        return principal if principal.is_active else None
+
+    def revoke(self, payload, kind):
+        """Revoke a verified token until it expires; False if it was already revoked"""
+        ttl = (self.access_ttl if kind == 'access' else self.refresh_ttl) - (time.time() - payload['iat'])
+        if ttl <= 0:
+            return False
+        return self.revocations.add(f"token:{payload['jti']}", 1, ttl, only_new=True)
+
+    def revoke_user(self, user_id):
+        """Revoke every token issued to the user so far (e.g. after a password change)"""
+        self.revocations.add(f'user:{user_id}', time.time(), max(self.access_ttl, self.refresh_ttl))
+
+
+def bearer_token(request):
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None